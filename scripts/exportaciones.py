@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+EXPORTACIONES ICS Y NDJSON
+==========================
+Genera calendarios iCalendar (uno con todo, uno por lugar y uno por categoría)
+y un volcado NDJSON de los eventos, para suscribirse desde cualquier
+calendario sin pasar por el CSV del Sheet.
+
+- Escritura en streaming: cada evento se escribe directamente al fichero,
+  sin montar el calendario entero en memoria.
+- Solo se regeneran los ficheros cuyos eventos de entrada han cambiado
+  (huella por fichero en exportaciones/manifiesto.json).
+"""
+
+from datetime import datetime, timedelta, timezone
+from indice_busqueda import plegar
+import hashlib
+import json
+import os
+import re
+
+# ======================================================================
+# CONFIGURACIÓN
+# ======================================================================
+
+DIRECTORIO_EXPORTACIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'exportaciones')
+MANIFIESTO = "manifiesto.json"
+
+# Cambiar si cambia el formato de salida, para forzar la regeneración
+VERSION_FORMATO = 1
+
+ZONA_HORARIA = "Europe/Madrid"
+DURACION_POR_DEFECTO = "PT2H"
+DOMINIO_UID = "almansa-eventos"
+
+CAMPOS_NDJSON = ['id', 'titulo', 'descripcion', 'fecha', 'hora', 'lugar', 'categoria',
+                 'precio', 'urlCompra', 'esGratuito', 'fuente', 'urlImagen']
+
+VTIMEZONE_MADRID = [
+    "BEGIN:VTIMEZONE",
+    "TZID:Europe/Madrid",
+    "BEGIN:DAYLIGHT",
+    "TZOFFSETFROM:+0100",
+    "TZOFFSETTO:+0200",
+    "TZNAME:CEST",
+    "DTSTART:19700329T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU",
+    "END:DAYLIGHT",
+    "BEGIN:STANDARD",
+    "TZOFFSETFROM:+0200",
+    "TZOFFSETTO:+0100",
+    "TZNAME:CET",
+    "DTSTART:19701025T030000",
+    "RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+]
+
+RE_FECHA = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+RE_HORA = re.compile(r'^(\d{1,2}):(\d{2})$')
+
+# ======================================================================
+# UTILIDADES
+# ======================================================================
+
+def slug(texto):
+    """'Teatro Regio' → 'teatro-regio'"""
+    return re.sub(r'[^a-z0-9]+', '-', plegar(texto)).strip('-') or 'sin-nombre'
+
+def feeds_de_evento(evento):
+    """Ficheros .ics en los que aparece un evento"""
+    feeds = ['todos.ics']
+    if evento.get('lugar'):
+        feeds.append(f"lugar-{slug(evento['lugar'])}.ics")
+    if evento.get('categoria'):
+        feeds.append(f"categoria-{slug(evento['categoria'])}.ics")
+    return feeds
+
+def exportable(evento):
+    return (RE_FECHA.match(str(evento.get('fecha', ''))) is not None
+            and str(evento.get('activo', 'TRUE')).upper() != 'FALSE')
+
+def huella_evento(evento):
+    return ('\x1f'.join(str(evento.get(c, '')) for c in CAMPOS_NDJSON) + '\x1e').encode()
+
+def escapar(texto):
+    """Escapa un valor TEXT de iCalendar (RFC 5545 §3.3.11)"""
+    return (str(texto).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def plegar_linea(linea):
+    """Parte una línea en trozos de 75 octetos como pide RFC 5545 §3.1"""
+    datos = linea.encode('utf-8')
+    if len(datos) <= 75:
+        return linea + '\r\n'
+    trozos = []
+    inicio = 0
+    limite = 75
+    while inicio < len(datos):
+        fin = min(inicio + limite, len(datos))
+        # No cortar un carácter UTF-8 por la mitad
+        while fin < len(datos) and (datos[fin] & 0xC0) == 0x80:
+            fin -= 1
+        trozos.append(datos[inicio:fin].decode('utf-8'))
+        inicio = fin
+        limite = 74  # las continuaciones empiezan con un espacio
+    return '\r\n '.join(trozos) + '\r\n'
+
+# ======================================================================
+# ESCRITURA
+# ======================================================================
+
+def lineas_vevent(evento, dtstamp):
+    """Líneas de un VEVENT (sin plegar)"""
+    anio, mes, dia = RE_FECHA.match(evento['fecha']).groups()
+    lineas = [
+        "BEGIN:VEVENT",
+        f"UID:{evento.get('id', '')}@{DOMINIO_UID}",
+        f"DTSTAMP:{dtstamp}",
+    ]
+
+    match_hora = RE_HORA.match(str(evento.get('hora', '')).strip())
+    if match_hora:
+        hora, minuto = int(match_hora.group(1)), match_hora.group(2)
+        lineas.append(f"DTSTART;TZID={ZONA_HORARIA}:{anio}{mes}{dia}T{hora:02d}{minuto}00")
+        lineas.append(f"DURATION:{DURACION_POR_DEFECTO}")
+    else:
+        # Sin hora conocida: evento de día completo
+        siguiente = datetime(int(anio), int(mes), int(dia)) + timedelta(days=1)
+        lineas.append(f"DTSTART;VALUE=DATE:{anio}{mes}{dia}")
+        lineas.append(f"DTEND;VALUE=DATE:{siguiente:%Y%m%d}")
+
+    descripcion = [evento.get('descripcion', ''), evento.get('precio', ''), evento.get('urlCompra', '')]
+    lineas.append(f"SUMMARY:{escapar(evento.get('titulo', ''))}")
+    if evento.get('lugar'):
+        lineas.append(f"LOCATION:{escapar(evento['lugar'])}")
+    lineas.append(f"DESCRIPTION:{escapar(chr(10).join(d for d in descripcion if d))}")
+    if evento.get('categoria'):
+        lineas.append(f"CATEGORIES:{escapar(evento['categoria'])}")
+    if evento.get('urlCompra'):
+        lineas.append(f"URL:{evento['urlCompra']}")
+    lineas.append("END:VEVENT")
+    return lineas
+
+def abrir_calendario(ruta, nombre):
+    """Abre el temporal de un .ics y escribe la cabecera"""
+    f = open(ruta + '.tmp', 'w', encoding='utf-8', newline='')
+    for linea in ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Almansa Informa//Eventos//ES",
+                  "CALSCALE:GREGORIAN", "METHOD:PUBLISH", f"X-WR-CALNAME:{escapar(nombre)}",
+                  f"X-WR-TIMEZONE:{ZONA_HORARIA}"] + VTIMEZONE_MADRID:
+        f.write(plegar_linea(linea))
+    return f
+
+def nombre_calendario(feed):
+    if feed == 'todos.ics':
+        return "Eventos Almansa"
+    _, resto = feed[:-4].split('-', 1)
+    return f"Eventos Almansa - {resto.replace('-', ' ').title()}"
+
+def exportar_eventos(eventos):
+    """
+    Exporta los eventos a exportaciones/*.ics y exportaciones/eventos.ndjson.
+    Primera pasada: huella por fichero. Segunda: escribe solo los que cambian.
+    """
+    print(f"\n📅 Exportando calendarios ICS y NDJSON...")
+    os.makedirs(DIRECTORIO_EXPORTACIONES, exist_ok=True)
+    ruta_manifiesto = os.path.join(DIRECTORIO_EXPORTACIONES, MANIFIESTO)
+    try:
+        with open(ruta_manifiesto, encoding='utf-8') as f:
+            manifiesto = json.load(f)
+    except (OSError, ValueError):
+        manifiesto = {}
+
+    # PASO 1: huellas (solo un hash incremental por fichero en memoria)
+    huellas = {'eventos.ndjson': hashlib.sha256(f"v{VERSION_FORMATO}".encode())}
+    for evento in eventos:
+        if not exportable(evento):
+            continue
+        huella = huella_evento(evento)
+        huellas['eventos.ndjson'].update(huella)
+        for feed in feeds_de_evento(evento):
+            huellas.setdefault(feed, hashlib.sha256(f"v{VERSION_FORMATO}".encode())).update(huella)
+
+    huellas = {feed: h.hexdigest() for feed, h in huellas.items()}
+    cambiados = {
+        feed for feed, huella in huellas.items()
+        if manifiesto.get(feed) != huella
+        or not os.path.exists(os.path.join(DIRECTORIO_EXPORTACIONES, feed))
+    }
+
+    # Feeds que ya no tienen eventos (lugar o categoría desaparecidos)
+    for feed in set(manifiesto) - set(huellas):
+        ruta = os.path.join(DIRECTORIO_EXPORTACIONES, feed)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+    if not cambiados:
+        print(f"   ✅ Sin cambios ({len(huellas)} ficheros)")
+        return
+
+    # PASO 2: streaming, evento a evento, solo a los ficheros cambiados
+    dtstamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    abiertos = {}
+    try:
+        for feed in cambiados:
+            ruta = os.path.join(DIRECTORIO_EXPORTACIONES, feed)
+            if feed == 'eventos.ndjson':
+                abiertos[feed] = open(ruta + '.tmp', 'w', encoding='utf-8')
+            else:
+                abiertos[feed] = abrir_calendario(ruta, nombre_calendario(feed))
+
+        for evento in eventos:
+            if not exportable(evento):
+                continue
+            if 'eventos.ndjson' in abiertos:
+                fila = {c: evento.get(c, '') for c in CAMPOS_NDJSON}
+                abiertos['eventos.ndjson'].write(json.dumps(fila, ensure_ascii=False) + '\n')
+            destinos = [abiertos[feed] for feed in feeds_de_evento(evento) if feed in abiertos]
+            if destinos:
+                texto = ''.join(plegar_linea(l) for l in lineas_vevent(evento, dtstamp))
+                for f in destinos:
+                    f.write(texto)
+
+        for feed, f in abiertos.items():
+            if feed != 'eventos.ndjson':
+                f.write(plegar_linea("END:VCALENDAR"))
+            f.close()
+            os.replace(f.name, f.name[:-4])
+    finally:
+        for f in abiertos.values():
+            if not f.closed:
+                f.close()
+                os.remove(f.name)
+
+    with open(ruta_manifiesto, 'w', encoding='utf-8') as f:
+        json.dump(huellas, f, indent=1, sort_keys=True)
+
+    print(f"   ✅ {len(cambiados)}/{len(huellas)} ficheros regenerados")
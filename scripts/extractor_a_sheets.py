@@ -22,6 +22,16 @@ import hashlib
 import time
 import json
 import os
+import bisect
+import base64
+import sys
+from html import unescape
+from urllib.parse import urljoin
+from urllib.request import Request, urlopen
+from zoneinfo import ZoneInfo
+from imagenes import procesar_imagenes, url_desde_card
+from indice_busqueda import publicar_indice
+from exportaciones import exportar_eventos
 
 # ======================================================================
 # ⚙️ CONFIGURACIÓN FÁCIL - MODIFICA AQUÍ ⚙️
@@ -41,12 +51,59 @@ BORRAR_EVENTOS_PASADOS = False
 #          0 = borra eventos en cuanto pasa su fecha
 DIAS_GRACIA_BORRADO = 7
 
+# 📦 ARCHIVAR EN VEZ DE BORRAR
+# ----------------------------
+# True  = los eventos pasados (según DIAS_GRACIA_BORRADO) se MUEVEN a una
+#         hoja de archivo por temporada, p. ej. "Archivo 2025-2026".
+#         La hoja principal queda pequeña y no se pierde el histórico.
+# False = se usa BORRAR_EVENTOS_PASADOS tal cual
+ARCHIVAR_EVENTOS_PASADOS = True
+
+# Mes en que empieza la temporada cultural (9 = septiembre)
+MES_INICIO_TEMPORADA = 9
+
+# 🖼️ IMÁGENES DE LOS EVENTOS
+# --------------------------
+# True  = descarga los carteles, genera miniaturas WebP en imagenes/
+#         y rellena la columna urlImagen
+# False = no toca las imágenes
+PROCESAR_IMAGENES = True
+
+# 🔎 ÍNDICE DE BÚSQUEDA PARA LA APP
+# ---------------------------------
+# True  = genera indice_busqueda.json (raíz, junto a imagenes/ y exportaciones/)
+#         (solo se retokenizan los eventos que cambian)
+PUBLICAR_INDICE_BUSQUEDA = True
+
+# 📅 CALENDARIOS ICS Y NDJSON
+# ---------------------------
+# True  = genera exportaciones/*.ics (todo, por lugar y por categoría)
+#         y exportaciones/eventos.ndjson; solo reescribe los que cambian
+EXPORTAR_CALENDARIOS = True
+
 # ======================================================================
 # CONFIGURACIÓN GENERAL (normalmente no tocar)
 # ======================================================================
 
 SHEET_ID = "1Rp5I6vuVnRCcyv3fEfvhAz_dMheQ6-tMlobpSLKNEcE"
 NOMBRE_HOJA = "Eventos"
+PREFIJO_HOJA_ARCHIVO = "Archivo"
+
+# Selectores aprendidos por fuente; se redescubren si el acierto baja de TASA_MINIMA_PLAN
+ARCHIVO_PLANES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'planes_extraccion.json')
+TASA_MINIMA_PLAN = 0.6
+
+# Endpoints JSON del propio recinto, descubiertos con el registro de red de Chrome
+USAR_API_JSON = True
+ARCHIVO_ENDPOINTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'endpoints_json.json')
+
+# Modo vigilancia: sondeo adaptativo según lo que cambia cada fuente
+INTERVALO_MINIMO_MIN = 10
+INTERVALO_MAXIMO_MIN = 12 * 60
+MEDIA_INICIAL_CAMBIOS_HORAS = 6
+FRACCION_SONDEO = 0.25      # sondear 4 veces por cada cambio esperado
+SUAVIZADO_CAMBIOS = 0.3     # peso del último intervalo entre cambios
+REESCRITURA_COMPLETA_HORAS = 24
 
 TOMATICKET_URLS = {
     "Teatro Regio": "https://www.tomaticket.es/es-es/recintos/teatro-regio-almansa",
@@ -65,6 +122,29 @@ CATEGORIAS = {
 # IMPORTANTE: Incluye urlImagen para no perderla
 COLUMNAS = ['id', 'titulo', 'descripcion', 'fecha', 'hora', 'lugar', 'categoria', 'precio', 'urlCompra', 'esGratuito', 'fuente', 'activo', 'urlImagen']
 
+# Quién manda en cada columna al actualizar un evento que ya está en el Sheet:
+# - SCRAPER: se actualiza si cambia en la fuente (salvo que alguien la haya editado a mano)
+# - MANUALES: solo se rellenan si están vacías, nunca se sobrescriben
+# - El resto (id, titulo, fecha, lugar, fuente) identifican el evento y no se tocan
+CAMPOS_SCRAPER = ['descripcion', 'hora', 'precio', 'urlCompra', 'esGratuito']
+CAMPOS_MANUALES = ['categoria', 'activo', 'urlImagen']
+ARCHIVO_HUELLAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'huellas_campos.json')
+
+# Lo que escribía el scraper antes de existir las huellas: una fila de TomaTicket
+# sin huella con uno de estos valores se considera escrita por él, no a mano
+SALIDA_SCRAPER_ANTERIOR = {
+    'hora': re.compile(r'^20:00$'),
+    'precio': re.compile(r'^(?:Ver en taquilla|Desde \d+ €)$'),
+    'urlCompra': re.compile(r'^https://www\.tomaticket\.es/'),
+    'esGratuito': re.compile(r'^FALSE$'),
+}
+
+# Las filas nuevas se insertan en su sitio por fecha (un insert_rows por hueco);
+# con más huecos que esto sale más a cuenta reescribir la hoja ordenada
+MAX_BLOQUES_INSERCION = 20
+
+RE_FECHA_ISO = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
 # ======================================================================
 # UTILIDADES
 # ======================================================================
@@ -123,12 +203,40 @@ def parsear_fecha_tomaticket(dia_texto, mes_texto):
         print(f"      ⚠️ Error parseando fecha '{dia_texto} {mes_texto}': {e}")
         return None
 
+def valor_columna(evento, campo):
+    """Valor de una celda tal y como se escribe en el Sheet"""
+    if campo == 'esGratuito':
+        return str(evento.get(campo, 'FALSE')).upper()
+    if campo == 'activo':
+        return str(evento.get(campo, 'TRUE')).upper()
+    return evento.get(campo, '')
+
+def evento_a_fila(evento):
+    """Convierte un evento en una fila del Sheet, en el orden de COLUMNAS"""
+    return [valor_columna(evento, campo) for campo in COLUMNAS]
+
+def letra_columna(campo):
+    """'precio' → 'H' (COLUMNAS no pasa de la Z)"""
+    return chr(ord('A') + COLUMNAS.index(campo))
+
+def huella_valor(valor):
+    return hashlib.md5(str(valor).encode()).hexdigest()[:8]
+
 # ======================================================================
 # GOOGLE SHEETS
 # ======================================================================
 
 def conectar_sheets():
-    """Conecta con Google Sheets"""
+    """
+    Conecta con Google Sheets.
+    Con HOJA_LOCAL=ruta.json usa una hoja falsa en fichero (sin credenciales).
+    """
+    ruta_local = os.environ.get('HOJA_LOCAL')
+    if ruta_local:
+        from hoja_falsa import HojaFalsa
+        print(f"📊 Usando hoja local {ruta_local} (sin Google Sheets)")
+        return HojaFalsa(ruta_local, titulo=NOMBRE_HOJA)
+    
     print("📊 Conectando con Google Sheets...")
     
     scopes = [
@@ -155,6 +263,8 @@ def obtener_eventos_existentes(hoja):
     """
     Obtiene TODOS los eventos del Sheet (incluidos los manuales).
     IMPORTANTE: Lee cualquier fila con datos, no solo las que empiezan con evt_
+    Cada evento lleva '_fila' (número de fila en el Sheet) para actualizar celdas.
+    Devuelve None si no se pudo leer: en ese caso NO se debe escribir nada.
     """
     try:
         todas_las_filas = hoja.get_all_values()
@@ -178,7 +288,7 @@ def obtener_eventos_existentes(hoja):
         eventos = {}
         eventos_leidos = 0
         
-        for fila in todas_las_filas[cabecera_idx + 1:]:
+        for num_fila, fila in enumerate(todas_las_filas[cabecera_idx + 1:], start=cabecera_idx + 2):
             # Verificar que la fila tiene datos (al menos ID y título)
             if fila and len(fila) >= 2 and fila[0] and fila[0].strip():
                 evento_id = fila[0].strip()
@@ -205,6 +315,7 @@ def obtener_eventos_existentes(hoja):
                     'fuente': fila[10] if len(fila) > 10 else '',
                     'activo': fila[11] if len(fila) > 11 else 'TRUE',
                     'urlImagen': fila[12] if len(fila) > 12 else '',
+                    '_fila': num_fila,
                 }
                 eventos_leidos += 1
         
@@ -213,118 +324,735 @@ def obtener_eventos_existentes(hoja):
         
     except Exception as e:
         print(f"⚠️ Error leyendo eventos existentes: {e}")
-        return {}
+        return None
+
+def fecha_ordenable(evento):
+    """
+    Clave de ordenación por fecha. Las fechas que no son YYYY-MM-DD
+    (eventos manuales mal escritos, 'Por confirmar'...) van al final,
+    así nunca caen por debajo del corte de archivado.
+    """
+    fecha = str(evento.get('fecha', '')).strip()
+    if RE_FECHA_ISO.match(fecha):
+        return fecha
+    return '9999-99-99'
+
+def esta_ordenada(claves):
+    """True si las claves de fecha_ordenable vienen en orden (como deja la hoja escribir_eventos)"""
+    anterior = ''
+    for clave in claves:
+        if clave < anterior:
+            return False
+        anterior = clave
+    return True
+
+def separar_eventos_pasados(eventos, fecha_limite):
+    """
+    Divide los eventos en (vigentes, pasados) respecto a fecha_limite (YYYY-MM-DD).
+    La hoja se escribe siempre ordenada por fecha y `eventos` viene en el orden
+    de sus filas, así que el corte es una búsqueda binaria, sin strptime por fila.
+    Solo se ordena si alguien desordenó la hoja a mano.
+    """
+    items = list(eventos.items())
+    if not esta_ordenada(fecha_ordenable(evento) for evento in eventos.values()):
+        print("   ⚠️ La hoja no está ordenada por fecha, se ordena antes de cortar")
+        items.sort(key=lambda item: fecha_ordenable(item[1]))
+    corte = bisect.bisect_left(items, fecha_limite, key=lambda item: fecha_ordenable(item[1]))
+    vigentes = dict(items[corte:])
+    pasados = [evento for _, evento in items[:corte]]
+    return vigentes, pasados
+
+def calcular_temporada(fecha_str):
+    """'2025-10-03' → '2025-2026' (la temporada empieza en MES_INICIO_TEMPORADA)"""
+    anio, mes = int(fecha_str[:4]), int(fecha_str[5:7])
+    if mes < MES_INICIO_TEMPORADA:
+        anio -= 1
+    return f"{anio}-{anio + 1}"
+
+def obtener_hoja_archivo(hoja, temporada):
+    """Devuelve la hoja de archivo de la temporada, creándola si no existe"""
+    nombre = f"{PREFIJO_HOJA_ARCHIVO} {temporada}"
+    sheet = hoja.spreadsheet
+    try:
+        return sheet.worksheet(nombre)
+    except gspread.exceptions.WorksheetNotFound:
+        print(f"      🆕 Creando hoja '{nombre}'")
+        hoja_archivo = sheet.add_worksheet(title=nombre, rows=100, cols=len(COLUMNAS))
+        hoja_archivo.update('A1', [COLUMNAS], value_input_option='RAW')
+        return hoja_archivo
+
+def archivar_eventos(hoja, eventos_pasados):
+    """
+    Mueve los eventos pasados a su hoja de archivo por temporada.
+    Una lectura de IDs y una escritura por temporada; no duplica si una
+    ejecución anterior ya archivó pero no llegó a reescribir la hoja principal.
+    Devuelve True si todo se archivó (si no, no se deben quitar de la hoja).
+    """
+    por_temporada = {}
+    for evento in eventos_pasados:
+        temporada = calcular_temporada(fecha_ordenable(evento))
+        por_temporada.setdefault(temporada, []).append(evento)
+    
+    try:
+        for temporada, eventos in sorted(por_temporada.items()):
+            hoja_archivo = obtener_hoja_archivo(hoja, temporada)
+            ids_archivados = set(hoja_archivo.col_values(1))
+            filas = [evento_a_fila(e) for e in eventos if e.get('id', '') not in ids_archivados]
+            if filas:
+                hoja_archivo.append_rows(filas, value_input_option='RAW')
+            print(f"      📦 {len(filas)} eventos → {PREFIJO_HOJA_ARCHIVO} {temporada}")
+        return True
+    except Exception as e:
+        print(f"   ❌ Error archivando (se mantienen en la hoja principal): {e}")
+        return False
 
-def limpiar_eventos_pasados(eventos_existentes):
+def limpiar_eventos_pasados(eventos_existentes, hoja=None):
     """
-    Elimina eventos pasados del diccionario.
-    ⚠️ SOLO SE EJECUTA SI BORRAR_EVENTOS_PASADOS = True
+    Quita eventos pasados del diccionario: los archiva si
+    ARCHIVAR_EVENTOS_PASADOS = True, o los borra si BORRAR_EVENTOS_PASADOS = True.
     """
-    if not BORRAR_EVENTOS_PASADOS:
+    if not (ARCHIVAR_EVENTOS_PASADOS or BORRAR_EVENTOS_PASADOS):
         print("   ℹ️ Borrado automático DESACTIVADO - No se elimina nada")
         return eventos_existentes
     
-    print(f"   🗑️ Borrado automático ACTIVADO (gracia: {DIAS_GRACIA_BORRADO} días)")
+    accion = "Archivado" if ARCHIVAR_EVENTOS_PASADOS else "Borrado"
+    print(f"   🗑️ {accion} automático ACTIVADO (gracia: {DIAS_GRACIA_BORRADO} días)")
     
-    hoy = datetime.now()
-    fecha_limite = hoy - timedelta(days=DIAS_GRACIA_BORRADO)
+    fecha_limite = (datetime.now() - timedelta(days=DIAS_GRACIA_BORRADO)).strftime('%Y-%m-%d')
+    eventos_vigentes, eventos_pasados = separar_eventos_pasados(eventos_existentes, fecha_limite)
     
-    eventos_vigentes = {}
-    eventos_eliminados = 0
+    if not eventos_pasados:
+        print(f"   ✅ No hay eventos pasados que eliminar")
+        return eventos_vigentes
     
-    for evento_id, evento in eventos_existentes.items():
-        fecha_str = evento.get('fecha', '')
-        
-        try:
-            fecha_evento = datetime.strptime(fecha_str, '%Y-%m-%d')
-            
-            if fecha_evento < fecha_limite:
-                eventos_eliminados += 1
-                print(f"      🗑️ Eliminando: {evento.get('titulo', '')[:40]}... ({fecha_str})")
-            else:
-                eventos_vigentes[evento_id] = evento
-        except:
-            # Si no puede parsear fecha, lo mantiene por seguridad
-            eventos_vigentes[evento_id] = evento
+    icono, verbo = ("📦", "Archivando") if ARCHIVAR_EVENTOS_PASADOS else ("🗑️", "Eliminando")
+    for evento in eventos_pasados:
+        print(f"      {icono} {verbo}: {evento.get('titulo', '')[:40]}... ({evento.get('fecha', '')})")
     
-    if eventos_eliminados > 0:
-        print(f"   📋 Eliminados {eventos_eliminados} eventos pasados")
+    if ARCHIVAR_EVENTOS_PASADOS:
+        if hoja is None or not archivar_eventos(hoja, eventos_pasados):
+            return eventos_existentes
+        print(f"   📦 Archivados {len(eventos_pasados)} eventos pasados")
     else:
-        print(f"   ✅ No hay eventos pasados que eliminar")
+        print(f"   📋 Eliminados {len(eventos_pasados)} eventos pasados")
     
     return eventos_vigentes
 
+def combinar_campos(existente, evento, huellas_evento):
+    """
+    Compara un evento extraído con su fila del Sheet, campo a campo.
+    Devuelve la lista de (campo, valor) que hay que escribir.
+    `huellas_evento` guarda la huella del último valor que dio la fuente en
+    cada campo del scraper; si la celda ya no coincide, la editó una persona.
+    Sin huella previa no se sabe quién escribió la celda: si es una fila de
+    TomaTicket con un valor de los que ponía el scraper (SALIDA_SCRAPER_ANTERIOR)
+    se toma como suyo y se corrige; si no, solo se rellenan las vacías y lo de
+    ahora queda como referencia para la próxima vez.
+    """
+    cambios = []
+    
+    for campo in CAMPOS_SCRAPER:
+        nuevo = valor_columna(evento, campo)
+        actual = valor_columna(existente, campo)
+        # Un valor vacío de la fuente nunca borra una celda (ni la huella)
+        if not nuevo:
+            continue
+        anterior = huellas_evento.get(campo)
+        if (anterior is None and existente.get('fuente') == 'TomaTicket'
+                and campo in SALIDA_SCRAPER_ANTERIOR and SALIDA_SCRAPER_ANTERIOR[campo].match(actual)):
+            anterior = huella_valor(actual)
+        huella_nueva = huella_valor(nuevo)
+        huellas_evento[campo] = huella_nueva
+        # Celda vacía: vuelve a ser del scraper
+        if not actual:
+            cambios.append((campo, nuevo))
+            continue
+        # Sin huella, sin cambios en la fuente, o editada a mano: no se toca
+        if anterior is None or huella_nueva == anterior or huella_valor(actual) != anterior:
+            continue
+        if nuevo != actual:
+            cambios.append((campo, nuevo))
+    
+    for campo in CAMPOS_MANUALES:
+        nuevo = valor_columna(evento, campo)
+        if nuevo and not existente.get(campo):
+            cambios.append((campo, nuevo))
+    
+    return cambios
+
 def escribir_eventos(hoja, eventos_nuevos, eventos_existentes):
     """
     Escribe eventos en el Sheet.
-    SIEMPRE mantiene los eventos existentes (a menos que se active el borrado).
+    SIEMPRE mantiene los eventos existentes (a menos que se active el borrado/archivado).
+    Solo envía lo que cambia: celdas actualizadas (un batch_update) y filas
+    nuevas insertadas en su sitio por fecha (un insert_rows por hueco, o
+    append_rows al final), así la hoja sigue ordenada. Los eventos archivados
+    o borrados son un bloque de filas seguidas al principio y se quitan con
+    un delete_rows. Se reescribe entera si está vacía o desordenada, o si las
+    filas nuevas caen en más de MAX_BLOQUES_INSERCION huecos.
     """
+    if eventos_existentes is None:
+        print("\n❌ No se pudo leer el Sheet: no se escribe nada para no perder datos")
+        return
+    
     print(f"\n📝 Procesando eventos...")
     print(f"   📊 Eventos en Sheet: {len(eventos_existentes)}")
     print(f"   📦 Eventos extraídos: {len(eventos_nuevos)}")
     
     # PASO 1: Aplicar limpieza (solo si está activada)
     print("\n🧹 Revisando eventos pasados...")
-    eventos_procesados = limpiar_eventos_pasados(eventos_existentes)
+    eventos_procesados = limpiar_eventos_pasados(eventos_existentes, hoja)
+    reescribir = not eventos_existentes
+    
+    # Filas quitadas: en una hoja ordenada son un bloque seguido, se borra de una
+    # vez y las de debajo suben (antes de calcular celdas y huecos con '_fila')
+    filas_quitadas = sorted(e['_fila'] for i, e in eventos_existentes.items()
+                            if i not in eventos_procesados and '_fila' in e)
+    bloque_borrado = None
+    if filas_quitadas:
+        primera, ultima = filas_quitadas[0], filas_quitadas[-1]
+        if ultima - primera + 1 == len(filas_quitadas):
+            bloque_borrado = (primera, ultima)
+            for evento in eventos_procesados.values():
+                if evento.get('_fila', 0) > ultima:
+                    evento['_fila'] -= len(filas_quitadas)
+        else:
+            print("   ⚠️ Las filas quitadas no son seguidas, se reescribe la hoja ordenada")
+            reescribir = True
     
-    # PASO 2: Combinar existentes + nuevos
+    # PASO 2: Combinar existentes + nuevos, campo a campo
     todos_los_eventos = dict(eventos_procesados)
+    huellas = leer_json_local(ARCHIVO_HUELLAS)
     
-    nuevos_añadidos = 0
+    nuevos = []
+    celdas = []
     for evento in eventos_nuevos:
-        if evento['id'] not in todos_los_eventos:
+        existente = todos_los_eventos.get(evento['id'])
+        if existente is None:
             todos_los_eventos[evento['id']] = evento
-            nuevos_añadidos += 1
+            huellas[evento['id']] = {c: huella_valor(valor_columna(evento, c)) for c in CAMPOS_SCRAPER}
+            nuevos.append(evento)
             print(f"   ➕ Nuevo: {evento['titulo'][:45]}... ({evento['fecha']})")
+            continue
+        
+        cambios = combinar_campos(existente, evento, huellas.setdefault(evento['id'], {}))
+        for campo, valor in cambios:
+            existente[campo] = valor
+            if '_fila' in existente:
+                celdas.append({'range': f"{letra_columna(campo)}{existente['_fila']}", 'values': [[valor]]})
+        if cambios:
+            print(f"   ✏️ Actualizado: {evento['titulo'][:40]}... ({', '.join(c for c, _ in cambios)})")
         else:
             print(f"   ⏭️ Ya existe: {evento['titulo'][:40]}...")
     
-    # PASO 3: SIEMPRE escribir (aunque no haya cambios, para mantener consistencia)
-    # Esto evita perder datos si hubo limpieza pero no hay nuevos
-    
     # Ordenar por fecha
     lista_eventos = list(todos_los_eventos.values())
-    lista_eventos.sort(key=lambda x: x.get('fecha', '9999-99-99'))
-    
-    print(f"\n📤 Escribiendo {len(lista_eventos)} eventos en el Sheet...")
-    
-    # Preparar datos
-    datos = [COLUMNAS]
-    
-    for evento in lista_eventos:
-        fila = [
-            evento.get('id', ''),
-            evento.get('titulo', ''),
-            evento.get('descripcion', ''),
-            evento.get('fecha', ''),
-            evento.get('hora', ''),
-            evento.get('lugar', ''),
-            evento.get('categoria', ''),
-            evento.get('precio', ''),
-            evento.get('urlCompra', ''),
-            str(evento.get('esGratuito', 'FALSE')).upper(),
-            evento.get('fuente', ''),
-            str(evento.get('activo', 'TRUE')).upper(),
-            evento.get('urlImagen', '')
-        ]
-        datos.append(fila)
-    
-    # Escribir
+    lista_eventos.sort(key=fecha_ordenable)
+    
+    # Hueco de cada fila nueva: búsqueda binaria sobre las filas de la hoja
+    bloques = {}
+    if not reescribir:
+        filas_hoja = sorted((e for e in eventos_procesados.values() if '_fila' in e), key=lambda e: e['_fila'])
+        claves_hoja = [fecha_ordenable(e) for e in filas_hoja]
+        if not esta_ordenada(claves_hoja):
+            print("   ⚠️ La hoja no está ordenada por fecha, se reescribe ordenada")
+            reescribir = True
+        else:
+            for evento in sorted(nuevos, key=fecha_ordenable):
+                posicion = bisect.bisect_right(claves_hoja, fecha_ordenable(evento))
+                bloques.setdefault(posicion, []).append(evento)
+            if len(bloques) > MAX_BLOQUES_INSERCION:
+                print(f"   ℹ️ Filas nuevas en {len(bloques)} huecos, se reescribe la hoja")
+                reescribir = True
+    
+    # PASO 3: Escribir solo lo necesario
     try:
-        hoja.clear()
-        hoja.update('A1', datos, value_input_option='RAW')
+        if reescribir:
+            print(f"\n📤 Reescribiendo {len(lista_eventos)} eventos en el Sheet...")
+            datos = [COLUMNAS] + [evento_a_fila(evento) for evento in lista_eventos]
+            hoja.clear()
+            hoja.update('A1', datos, value_input_option='RAW')
+        else:
+            print(f"\n📤 Enviando cambios: {len(celdas)} celdas, {len(nuevos)} filas nuevas en {len(bloques)} huecos...")
+            if bloque_borrado:
+                print(f"   🧹 Quitando filas {bloque_borrado[0]}-{bloque_borrado[1]}")
+                hoja.delete_rows(*bloque_borrado)
+            if celdas:
+                hoja.batch_update(celdas, value_input_option='RAW')
+            # De abajo arriba, para que cada inserción no mueva las filas de las siguientes
+            for posicion in sorted(bloques, reverse=True):
+                filas = [evento_a_fila(evento) for evento in bloques[posicion]]
+                if posicion == len(filas_hoja):
+                    hoja.append_rows(filas, value_input_option='RAW')
+                else:
+                    hoja.insert_rows(filas, row=filas_hoja[posicion]['_fila'], value_input_option='RAW')
         print(f"\n✅ Escritura completada:")
-        print(f"   ➕ Eventos nuevos añadidos: {nuevos_añadidos}")
+        print(f"   ➕ Eventos nuevos añadidos: {len(nuevos)}")
+        print(f"   ✏️ Celdas actualizadas: {len(celdas)}")
         print(f"   📊 Total en Sheet: {len(lista_eventos)}")
     except Exception as e:
         print(f"❌ Error escribiendo: {e}")
+        return
+    
+    # Huellas solo de los eventos que siguen en la hoja
+    escribir_json_local(ARCHIVO_HUELLAS, {i: h for i, h in huellas.items() if i in todos_los_eventos})
+    
+    # PASO 4: Índice de búsqueda (los pasados archivados siguen siendo buscables)
+    if PUBLICAR_INDICE_BUSQUEDA:
+        conservar_desde = None
+        if ARCHIVAR_EVENTOS_PASADOS:
+            conservar_desde = (datetime.now() - timedelta(days=DIAS_GRACIA_BORRADO)).strftime('%Y-%m-%d')
+        try:
+            publicar_indice(lista_eventos, conservar_desde)
+        except Exception as e:
+            print(f"   ⚠️ Error generando índice de búsqueda: {e}")
+    
+    # PASO 5: Calendarios ICS y volcado NDJSON
+    if EXPORTAR_CALENDARIOS:
+        try:
+            exportar_eventos(lista_eventos)
+        except Exception as e:
+            print(f"   ⚠️ Error exportando calendarios: {e}")
+
+# ======================================================================
+# DATOS ESTRUCTURADOS (schema.org) - VÍA RÁPIDA
+# ======================================================================
+
+RE_JSONLD = re.compile(
+    r'<script[^>]+type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+    re.I | re.S
+)
+RE_MICRODATA_EVENT = re.compile(r'itemtype=["\']https?://schema\.org/\w*Event["\']', re.I)
+RE_SCHEMA_EVENT = re.compile(r'schema\.org/\w*Event$', re.I)
+RE_TIPO_EVENT = re.compile(r'Event$')
+# Primer enlace de cada tarjeta (article/div con clase event|card), sin construir el DOM
+RE_ENLACE_TARJETA = re.compile(
+    r'<(?:article|div)\b[^>]*class=["\'][^"\']*(?:event|card)[^"\']*["\'][^>]*>.*?href=["\']([^"\']+)["\']',
+    re.I | re.S
+)
+RE_FECHA_API = re.compile(r'(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2}))?')
+ZONA_MADRID = ZoneInfo('Europe/Madrid')
+
+def buscar_eventos_schema(nodo):
+    """Recorre un JSON-LD (listas, @graph, ItemList) y devuelve los nodos tipo Event"""
+    encontrados = []
+    if isinstance(nodo, list):
+        for hijo in nodo:
+            encontrados.extend(buscar_eventos_schema(hijo))
+    elif isinstance(nodo, dict):
+        tipos = nodo.get('@type', '')
+        tipos = tipos if isinstance(tipos, list) else [tipos]
+        if any(isinstance(t, str) and RE_TIPO_EVENT.search(t) for t in tipos):
+            encontrados.append(nodo)
+        for clave in ('@graph', 'itemListElement', 'item', 'subEvent'):
+            if clave in nodo:
+                encontrados.extend(buscar_eventos_schema(nodo[clave]))
+    return encontrados
+
+def extraer_jsonld(html):
+    """Lee los bloques application/ld+json con una regex, sin construir el DOM"""
+    eventos = []
+    for bloque in RE_JSONLD.findall(html):
+        try:
+            eventos.extend(buscar_eventos_schema(json.loads(bloque.strip())))
+        except ValueError:
+            continue
+    return eventos
+
+def hay_tarjetas_sin_cubrir(html, url, urls_cubiertas):
+    """
+    True si el HTML tiene tarjetas cuyo enlace no vino en los datos estructurados
+    (o no hay datos estructurados): solo entonces hace falta el DOM completo.
+    """
+    if not urls_cubiertas:
+        return True
+    enlaces = {urljoin(url, unescape(href)) for href in RE_ENLACE_TARJETA.findall(html)}
+    return bool(enlaces - urls_cubiertas)
+
+def valor_itemprop(elem):
+    """Valor de un itemprop de microdata según la etiqueta"""
+    for atributo in ('content', 'datetime', 'src', 'href'):
+        if elem.get(atributo):
+            return elem[atributo]
+    return elem.get_text(strip=True)
+
+def extraer_microdata(soup):
+    """Convierte los itemscope schema.org/Event al mismo formato que el JSON-LD"""
+    eventos = []
+    for bloque in soup.find_all(attrs={'itemtype': RE_SCHEMA_EVENT}):
+        datos = {}
+        for elem in bloque.find_all(attrs={'itemprop': True}):
+            prop = elem['itemprop']
+            # Solo propiedades directas del evento, no las de location/offers anidados
+            if prop in datos or elem.find_parent(attrs={'itemscope': True}) is not bloque:
+                continue
+            if elem.has_attr('itemscope'):
+                datos[prop] = {
+                    hijo['itemprop']: valor_itemprop(hijo)
+                    for hijo in elem.find_all(attrs={'itemprop': True})
+                }
+            else:
+                datos[prop] = valor_itemprop(elem)
+        eventos.append(datos)
+    return eventos
+
+def primero(valor):
+    """schema.org permite valor simple o lista: devuelve el primero"""
+    if isinstance(valor, list):
+        return valor[0] if valor else None
+    return valor
+
+def precio_desde_offers(offers):
+    """Devuelve el precio mínimo de las ofertas (float) o None"""
+    if not offers:
+        return None
+    precios = []
+    for oferta in (offers if isinstance(offers, list) else [offers]):
+        if not isinstance(oferta, dict):
+            continue
+        for clave in ('lowPrice', 'price'):
+            valor = str(oferta.get(clave, '')).replace(',', '.').strip()
+            try:
+                precios.append(float(valor))
+                break
+            except ValueError:
+                continue
+    return min(precios) if precios else None
+
+def fecha_hora_iso(texto):
+    """
+    '2027-02-14T18:30:00Z' → ('2027-02-14', '19:30'). Con zona (Z u offset) se
+    pasa a hora de Madrid; sin zona se toma tal cual. Hora None si no viene.
+    """
+    texto = str(texto).strip()
+    try:
+        momento = datetime.fromisoformat(texto[:-1] + '+00:00' if texto.endswith('Z') else texto)
+    except ValueError:
+        match = RE_FECHA_API.match(texto)
+        if not match:
+            return None, None
+        anio, mes, dia, hora, minuto = match.groups()
+        return f"{anio}-{mes}-{dia}", (f"{hora}:{minuto}" if hora else None)
+    if momento.tzinfo is not None:
+        momento = momento.astimezone(ZONA_MADRID)
+    return momento.strftime('%Y-%m-%d'), (momento.strftime('%H:%M') if len(texto) > 10 else None)
+
+def evento_desde_schema(datos, url, teatro_nombre):
+    """Convierte un nodo schema.org/Event en nuestro formato de evento (o None)"""
+    titulo_raw = str(primero(datos.get('name')) or '').strip()
+    fecha_iso, hora = fecha_hora_iso(primero(datos.get('startDate')) or '')
+    if len(titulo_raw) < 5 or not fecha_iso:
+        return None
+    if 'Cancelled' in str(datos.get('eventStatus', '')):
+        return None
+    
+    titulo = limpiar_titulo(titulo_raw)
+    hora = hora or "20:00"
+    
+    # El lugar solo se cambia si es otro recinto conocido (el ID depende de él)
+    lugar = teatro_nombre
+    location = primero(datos.get('location'))
+    nombre_location = location.get('name', '') if isinstance(location, dict) else str(location or '')
+    for recinto in TOMATICKET_URLS:
+        if recinto.lower() in nombre_location.lower():
+            lugar = recinto
+            break
+    
+    precio = "Ver en taquilla"
+    es_gratuito = 'FALSE'
+    valor_precio = precio_desde_offers(datos.get('offers'))
+    if valor_precio == 0:
+        precio, es_gratuito = "Gratis", 'TRUE'
+    elif valor_precio is not None:
+        precio = f"Desde {valor_precio:g} €"
+    
+    imagen = primero(datos.get('image'))
+    if isinstance(imagen, dict):
+        imagen = imagen.get('url', '')
+    
+    link = urljoin(url, str(primero(datos.get('url')) or '')) if datos.get('url') else url
+    
+    return {
+        'id': generar_id(titulo, fecha_iso, lugar),
+        'titulo': titulo,
+        'descripcion': str(primero(datos.get('description')) or '').strip()[:300],
+        'fecha': fecha_iso,
+        'hora': hora,
+        'lugar': lugar,
+        'categoria': determinar_categoria(titulo),
+        'precio': precio,
+        'urlCompra': link,
+        'esGratuito': es_gratuito,
+        'fuente': 'TomaTicket',
+        'activo': 'TRUE',
+        'urlImagen': '',
+        'imagenOrigen': urljoin(url, imagen) if imagen else ''
+    }
+
+# ======================================================================
+# PLANES DE EXTRACCIÓN APRENDIDOS
+# ======================================================================
+
+RE_CLASE_CARD = re.compile(r'event|card', re.I)
+RE_NOMBRE_CSS = re.compile(r'^[A-Za-z_][\w-]*$')
+
+def selector_css(elem):
+    """'article.event-card' a partir de la etiqueta y sus clases"""
+    clases = [c for c in elem.get('class', []) if RE_NOMBRE_CSS.match(c)]
+    return elem.name + ''.join('.' + c for c in clases)
+
+def selector_contenedor(elem):
+    """Selector de una sección: su id si lo tiene, si no etiqueta + clases"""
+    if RE_NOMBRE_CSS.match(elem.get('id', '') or ''):
+        return f"#{elem['id']}"
+    return selector_css(elem)
+
+def leer_json_local(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def escribir_json_local(ruta, datos):
+    try:
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2, sort_keys=True)
+    except OSError as e:
+        print(f"   ⚠️ No se pudo guardar {os.path.basename(ruta)}: {e}")
+
+def cargar_planes():
+    """Lee los planes guardados {url: {contenedor, tarjeta, titulo, tasaExito}}"""
+    return leer_json_local(ARCHIVO_PLANES)
+
+def guardar_planes(planes):
+    escribir_json_local(ARCHIVO_PLANES, planes)
+
+# ======================================================================
+# API JSON DEL RECINTO (registro de red de Chrome)
+# ======================================================================
+
+CLAVES_API = {
+    'titulo': ['name', 'nombre', 'title', 'titulo', 'eventname', 'nombreevento'],
+    'fecha': ['startdate', 'fecha', 'date', 'fechainicio', 'fecha_inicio', 'start', 'datestart',
+              'sessiondate', 'fechasesion', 'fechaevento'],
+    'precio': ['lowprice', 'price', 'precio', 'minprice', 'preciodesde', 'pricefrom', 'preciominimo'],
+    'url': ['url', 'link', 'href', 'urlcompra', 'urlevento'],
+    'imagen': ['image', 'imagen', 'img', 'poster', 'cartel', 'thumbnail', 'imageurl', 'urlimagen'],
+    'lugar': ['venue', 'recinto', 'lugar', 'location', 'espacio'],
+}
+RE_FECHA_API_ES = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})(?:\s+(\d{1,2}):(\d{2}))?')
+RE_NUMERO = re.compile(r'\d+(?:[.,]\d+)?')
+# Solo se acepta como enlace una URL absoluta o una ruta desde la raíz (no un slug)
+RE_URL_API = re.compile(r'^(?:https?://|/)', re.I)
+
+def cargar_endpoints():
+    """Lee los endpoints descubiertos {url_recinto: {url, metodo, cuerpo, ruta, campos}}"""
+    return leer_json_local(ARCHIVO_ENDPOINTS)
+
+def guardar_endpoints(endpoints):
+    escribir_json_local(ARCHIVO_ENDPOINTS, endpoints)
+
+def mapear_campos(item):
+    """Qué clave del item JSON corresponde a cada campo nuestro (sin distinguir mayúsculas)"""
+    claves = {k.lower(): k for k in item}
+    campos = {}
+    for campo, candidatas in CLAVES_API.items():
+        for candidata in candidatas:
+            if candidata in claves:
+                campos[campo] = claves[candidata]
+                break
+    return campos
+
+def buscar_listas_eventos(nodo, ruta=(), profundidad=0):
+    """
+    Busca en un JSON todas las listas de dicts que parecen un listado de
+    eventos (con título y fecha). Devuelve [(puntuacion, ruta, campos, items)].
+    """
+    encontradas = []
+    if profundidad > 5:
+        return encontradas
+    if isinstance(nodo, list):
+        dicts = [x for x in nodo if isinstance(x, dict)]
+        if dicts:
+            campos = mapear_campos(dicts[0])
+            if 'titulo' in campos and 'fecha' in campos:
+                validos = sum(1 for x in dicts if x.get(campos['titulo']) and x.get(campos['fecha']))
+                if validos * 2 >= len(dicts):
+                    encontradas.append((validos, list(ruta), campos, dicts))
+        for i, hijo in enumerate(nodo[:3]):
+            encontradas.extend(buscar_listas_eventos(hijo, ruta + (i,), profundidad + 1))
+    elif isinstance(nodo, dict):
+        for clave, hijo in nodo.items():
+            encontradas.extend(buscar_listas_eventos(hijo, ruta + (clave,), profundidad + 1))
+    return encontradas
+
+def descubrir_endpoints(driver):
+    """
+    Revisa el registro de red (performance log) de la carga de la página y
+    devuelve los candidatos XHR/fetch JSON con listados de eventos:
+    [(puntuacion, endpoint, items)], de mayor a menor puntuación.
+    No se sabe aún si son de este recinto: ver elegir_endpoint.
+    """
+    peticiones = {}
+    respuestas = []
+    for entrada in driver.get_log('performance'):
+        try:
+            mensaje = json.loads(entrada['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        params = mensaje.get('params', {})
+        if mensaje.get('method') == 'Network.requestWillBeSent':
+            peticiones[params.get('requestId')] = params.get('request', {})
+        elif mensaje.get('method') == 'Network.responseReceived':
+            respuesta = params.get('response', {})
+            if params.get('type') in ('XHR', 'Fetch') and 'json' in respuesta.get('mimeType', ''):
+                respuestas.append((params.get('requestId'), respuesta.get('url', '')))
+    
+    candidatos = []
+    for request_id, url_api in respuestas:
+        try:
+            cuerpo = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            texto = cuerpo.get('body', '')
+            if cuerpo.get('base64Encoded'):
+                texto = base64.b64decode(texto).decode('utf-8', errors='replace')
+            listas = buscar_listas_eventos(json.loads(texto))
+        except Exception:
+            continue
+        peticion = peticiones.get(request_id, {})
+        for puntuacion, ruta, campos, items in listas:
+            candidatos.append((puntuacion, {
+                'url': url_api,
+                'metodo': peticion.get('method', 'GET'),
+                'cuerpo': peticion.get('postData', ''),
+                'tipoCuerpo': peticion.get('headers', {}).get('Content-Type', ''),
+                'ruta': ruta,
+                'campos': campos,
+            }, items))
+    
+    candidatos.sort(key=lambda c: c[0], reverse=True)
+    return candidatos
+
+def clave_titulo(titulo):
+    return re.sub(r'\s+', ' ', str(titulo)).strip().lower()
+
+def elegir_endpoint(candidatos, eventos_pagina, url, teatro_nombre):
+    """
+    Elige el candidato cuyos items coinciden (título o urlCompra) con más eventos
+    sacados de la página en esta misma carga. Sin coincidencias no se guarda
+    ninguno: un listado de recomendados de otros recintos no es el de este.
+    """
+    titulos = {clave_titulo(e['titulo']) for e in eventos_pagina}
+    urls = {e['urlCompra'] for e in eventos_pagina if e['urlCompra'] != url}
+    mejor, mejor_coincidencias = None, 0
+    for _, endpoint, items in candidatos:
+        eventos_api = eventos_desde_items(items, endpoint['campos'], url, teatro_nombre)
+        coincidencias = sum(
+            1 for e in eventos_api
+            if clave_titulo(e['titulo']) in titulos or e['urlCompra'] in urls
+        )
+        if coincidencias > mejor_coincidencias:
+            mejor, mejor_coincidencias = endpoint, coincidencias
+    return mejor
+
+def fecha_hora_api(valor):
+    """
+    '2026-02-14T19:30:00', '2026-02-14T18:30:00Z', '14/02/2026 19:30' o epoch
+    → ('2026-02-14', '19:30' o None), siempre en hora de Madrid
+    """
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        segundos = valor / 1000 if valor > 1e11 else valor
+        momento = datetime.fromtimestamp(segundos, ZONA_MADRID)
+        return momento.strftime('%Y-%m-%d'), momento.strftime('%H:%M')
+    texto = str(valor)
+    match = RE_FECHA_API.search(texto)
+    if match:
+        return fecha_hora_iso(texto[match.start():])
+    match = RE_FECHA_API_ES.search(texto)
+    if not match:
+        return None, None
+    dia, mes, anio, hora, minuto = match.groups()
+    fecha = f"{int(anio):04d}-{int(mes):02d}-{int(dia):02d}"
+    return fecha, (f"{int(hora):02d}:{minuto}" if hora else None)
+
+def extraer_eventos_api(url, teatro_nombre, endpoint):
+    """
+    Llama directamente al endpoint JSON del recinto y convierte sus items
+    al formato schema.org para reutilizar evento_desde_schema.
+    Los items de otros recintos se descartan.
+    """
+    cabeceras = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Accept': 'application/json',
+        'Referer': url,
+        'X-Requested-With': 'XMLHttpRequest',
+    }
+    datos_post = None
+    if endpoint.get('metodo', 'GET') != 'GET':
+        datos_post = endpoint.get('cuerpo', '').encode('utf-8')
+        if endpoint.get('tipoCuerpo'):
+            cabeceras['Content-Type'] = endpoint['tipoCuerpo']
+    
+    peticion = Request(endpoint['url'], data=datos_post, headers=cabeceras, method=endpoint.get('metodo', 'GET'))
+    with urlopen(peticion, timeout=20) as respuesta:
+        nodo = json.loads(respuesta.read().decode('utf-8'))
+    
+    for paso in endpoint['ruta']:
+        nodo = nodo[paso]
+    
+    return eventos_desde_items(nodo, endpoint['campos'], url, teatro_nombre)
+
+def lugar_ajeno(location, teatro_nombre):
+    """
+    True si el item nombra otro recinto. Se aceptan los recintos conocidos y
+    cualquier lugar de Almansa (se asigna teatro_nombre, como en schema.org).
+    """
+    if isinstance(location, dict):
+        location = location.get('name', '')
+    nombre = str(location or '').lower()
+    if not nombre.strip():
+        return False
+    conocidos = [teatro_nombre.lower()] + [recinto.lower() for recinto in TOMATICKET_URLS] + ['almansa']
+    return not any(conocido in nombre for conocido in conocidos)
+
+def eventos_desde_items(items, campos, url, teatro_nombre):
+    """Convierte los items de un listado JSON al formato schema.org y de ahí a eventos"""
+    eventos = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        if 'lugar' in campos and lugar_ajeno(item.get(campos['lugar']), teatro_nombre):
+            continue
+        fecha, hora = fecha_hora_api(item.get(campos['fecha'], ''))
+        if not fecha:
+            continue
+        
+        datos = {
+            'name': item.get(campos['titulo'], ''),
+            'startDate': f"{fecha}T{hora}" if hora else fecha,
+        }
+        if 'precio' in campos:
+            match = RE_NUMERO.search(str(item.get(campos['precio'], '')))
+            if match:
+                datos['offers'] = {'price': match.group(0)}
+        if 'url' in campos and RE_URL_API.match(str(item.get(campos['url']) or '')):
+            datos['url'] = item[campos['url']]
+        if 'imagen' in campos:
+            datos['image'] = item.get(campos['imagen'])
+        if 'lugar' in campos:
+            datos['location'] = item.get(campos['lugar'])
+        
+        evento = evento_desde_schema(datos, url, teatro_nombre)
+        if evento:
+            eventos.append(evento)
+    return eventos
 
 # ======================================================================
 # SELENIUM - EXTRACCIÓN
 # ======================================================================
 
-def crear_driver():
-    """Crea instancia de Chrome headless"""
+def crear_driver(capturar_red=False):
+    """Crea instancia de Chrome headless (con registro de red si capturar_red)"""
     chrome_options = Options()
     chrome_options.add_argument('--headless=new')
     chrome_options.add_argument('--no-sandbox')
@@ -334,153 +1062,480 @@ def crear_driver():
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
     chrome_options.add_argument('--window-size=1920,1080')
+    if capturar_red:
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
     
     driver = webdriver.Chrome(options=chrome_options)
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    if capturar_red:
+        driver.execute_cdp_cmd('Network.enable', {})
     return driver
 
-def extraer_eventos_tomaticket(url, teatro_nombre):
-    """Extrae eventos de TomaTicket - SOLO próximos eventos"""
+def evento_desde_card(card, titulo_elem, url, teatro_nombre):
+    """
+    Construye el evento de una tarjeta a partir de su elemento de título.
+    Devuelve None si no hay título o fecha válidos (no filtra pasados).
+    """
+    titulo_raw = titulo_elem.get_text(strip=True)
+    if len(titulo_raw) < 5:
+        return None
+    
+    titulo = limpiar_titulo(titulo_raw)
+    
+    # FECHA
+    fecha_iso = None
+    texto_card = card.get_text()
+    
+    match = re.search(r'(\d{1,2})\s*(Enero|Febrero|Marzo|Abril|Mayo|Junio|Julio|Agosto|Septiembre|Octubre|Noviembre|Diciembre)', texto_card, re.IGNORECASE)
+    if match:
+        fecha_iso = parsear_fecha_tomaticket(match.group(1), match.group(2))
+    
+    if not fecha_iso:
+        return None
+    
+    # PRECIO
+    precio = "Ver en taquilla"
+    match_precio = re.search(r'[Dd]esde\s*(\d+)\s*€', texto_card)
+    if match_precio:
+        precio = f"Desde {match_precio.group(1)} €"
+    
+    # HORA
+    hora = "20:00"
+    
+    # URL
+    link_elem = card.find('a', href=True)
+    link = url
+    if link_elem and link_elem.get('href'):
+        href = link_elem['href']
+        if href.startswith('http'):
+            link = href
+        elif href.startswith('/'):
+            link = 'https://www.tomaticket.es' + href
+    
+    return {
+        'id': generar_id(titulo, fecha_iso, teatro_nombre),
+        'titulo': titulo,
+        'descripcion': '',
+        'fecha': fecha_iso,
+        'hora': hora,
+        'lugar': teatro_nombre,
+        'categoria': determinar_categoria(titulo),
+        'precio': precio,
+        'urlCompra': link,
+        'esGratuito': 'FALSE',
+        'fuente': 'TomaTicket',
+        'activo': 'TRUE',
+        'urlImagen': '',
+        'imagenOrigen': url_desde_card(card, url)
+    }
+
+def card_cubierta(card, url, urls_cubiertas):
+    """True si la tarjeta ya vino en los datos estructurados"""
+    if not urls_cubiertas:
+        return False
+    link_elem = card.find('a', href=True)
+    return bool(link_elem) and urljoin(url, link_elem['href']) in urls_cubiertas
+
+def buscar_secciones(soup):
+    """Devuelve (seccion_proximos, seccion_pasados) según los títulos h2/h3 de la página"""
+    seccion_proximos = None
+    seccion_pasados = None
+    
+    for elemento in soup.find_all(['h2', 'h3']):
+        texto = elemento.get_text().lower()
+        
+        if 'próximos' in texto or 'proximos' in texto:
+            padre = elemento.find_parent(['section', 'div'])
+            if padre:
+                seccion_proximos = padre
+                
+        elif 'anteriormente' in texto or 'pasados' in texto or 'celebrados' in texto:
+            padre = elemento.find_parent(['section', 'div'])
+            if padre:
+                seccion_pasados = padre
+    
+    return seccion_proximos, seccion_pasados
+
+def ids_tarjetas_pasadas(seccion_pasados):
+    """Tarjetas de la sección de pasados: un recorrido, luego comprobación O(1)"""
+    if not seccion_pasados:
+        return set()
+    return {id(e) for e in seccion_pasados.find_all(['article', 'div'], class_=RE_CLASE_CARD)}
+
+def aplicar_plan(soup, plan, url, teatro_nombre, urls_cubiertas):
+    """
+    Extrae con los selectores CSS del plan aprendido, sin heurísticas.
+    La sección de pasados se vuelve a buscar siempre: puede aparecer después
+    de aprender el plan, y sus tarjetas también encajan con los selectores.
+    Devuelve (eventos, tasa_exito); tasa None si no quedaba ninguna tarjeta
+    por probar (todas venían en los datos estructurados), que no es un fallo.
+    """
+    selector = f"{plan['contenedor']} {plan['tarjeta']}" if plan['contenedor'] else plan['tarjeta']
+    _, seccion_pasados = buscar_secciones(soup)
+    ids_pasados = ids_tarjetas_pasadas(seccion_pasados)
+    eventos = []
+    intentos = 0
+    
+    for card in soup.select(selector):
+        if id(card) in ids_pasados or card_cubierta(card, url, urls_cubiertas):
+            continue
+        intentos += 1
+        titulo_elem = card.select_one(plan['titulo'])
+        evento = evento_desde_card(card, titulo_elem, url, teatro_nombre) if titulo_elem else None
+        if evento:
+            eventos.append(evento)
+    
+    return eventos, (len(eventos) / intentos if intentos else None)
+
+def descubrir_con_heuristicas(soup, url, teatro_nombre, urls_cubiertas):
+    """
+    Extracción heurística original (secciones, clases event|card, h2-h4).
+    Devuelve (eventos, plan) con el plan aprendido de las tarjetas que
+    funcionaron, o plan None si no se puede aplicar de forma segura.
+    """
+    # Buscar secciones
+    seccion_proximos, seccion_pasados = buscar_secciones(soup)
+    
+    if seccion_proximos:
+        contenedor = seccion_proximos
+        print(f"   📍 Encontrada sección 'Próximos eventos'")
+    else:
+        contenedor = soup
+        print(f"   ⚠️ No se encontró sección específica, usando filtro por fecha")
+    
+    cards = contenedor.find_all(['article', 'div'], class_=RE_CLASE_CARD)
+    
+    ids_pasados = ids_tarjetas_pasadas(seccion_pasados)
+    
+    eventos = []
+    votos = {}
+    for card in cards:
+        try:
+            if id(card) in ids_pasados or card_cubierta(card, url, urls_cubiertas):
+                continue
+            
+            # TÍTULO
+            titulo_elem = card.find(['h2', 'h3', 'h4', 'a'], class_=re.compile(r'title|titulo|name', re.I))
+            if not titulo_elem:
+                titulo_elem = card.find(['h2', 'h3', 'h4'])
+            
+            if not titulo_elem:
+                continue
+            
+            evento = evento_desde_card(card, titulo_elem, url, teatro_nombre)
+            if not evento:
+                continue
+            
+            eventos.append(evento)
+            clave = (selector_css(card), selector_css(titulo_elem))
+            votos.setdefault(clave, set()).add(evento['id'])
+        except Exception:
+            continue
+    
+    # El plan solo vale si el contenedor identifica de forma única los próximos
+    plan = None
+    if votos:
+        (tarjeta, titulo), _ = max(votos.items(), key=lambda item: len(item[1]))
+        selector_seccion = selector_contenedor(seccion_proximos) if seccion_proximos else ''
+        if seccion_pasados is None or (selector_seccion and len(soup.select(selector_seccion)) == 1):
+            plan = {'contenedor': selector_seccion, 'tarjeta': tarjeta, 'titulo': titulo}
+    
+    return eventos, plan
+
+def extraer_tarjetas(soup, url, teatro_nombre, planes, urls_cubiertas):
+    """
+    Eventos de las tarjetas HTML no cubiertas por los datos estructurados:
+    con el plan aprendido y, si falla, redescubriendo con las heurísticas.
+    """
+    # PLAN APRENDIDO: selectores directos; si falla, se vuelve a descubrir
+    eventos_card = None
+    plan = planes.get(url)
+    if plan:
+        try:
+            eventos_card, tasa = aplicar_plan(soup, plan, url, teatro_nombre, urls_cubiertas)
+        except Exception as e:
+            print(f"   ⚠️ Plan no aplicable: {e}")
+            tasa = 0.0
+        if tasa is None:
+            print(f"   🧭 Plan aprendido: sin tarjetas pendientes tras los datos estructurados")
+        elif tasa >= TASA_MINIMA_PLAN:
+            plan['tasaExito'] = round(tasa, 2)
+            print(f"   🧭 Plan aprendido aplicado ({tasa:.0%} de acierto)")
+        else:
+            print(f"   🔄 Plan con {tasa:.0%} de acierto, redescubriendo selectores...")
+            eventos_card = None
+    
+    if eventos_card is None:
+        eventos_card, nuevo_plan = descubrir_con_heuristicas(soup, url, teatro_nombre, urls_cubiertas)
+        if nuevo_plan:
+            nuevo_plan['tasaExito'] = 1.0
+            planes[url] = nuevo_plan
+            print(f"   🧭 Plan guardado: {nuevo_plan['tarjeta']} → {nuevo_plan['titulo']}")
+    
+    return eventos_card
+
+def extraer_eventos_tomaticket(url, teatro_nombre, planes=None, driver=None, endpoints=None):
+    """
+    Extrae eventos de TomaTicket - SOLO próximos eventos.
+    Si se pasa `planes`, usa (y actualiza) el plan aprendido de esta fuente.
+    Si se pasa `driver` (modo vigilancia) se reutiliza y no se cierra.
+    Si se pasa `endpoints`, primero prueba la API JSON del recinto sin abrir
+    Chrome; si no hay o falla, la redescubre con el registro de red.
+    """
     print(f"\n🎭 Extrayendo {teatro_nombre}...")
     eventos = []
-    driver = None
+    driver_propio = driver is None
+    planes = planes if planes is not None else {}
+    hoy = datetime.now()
+    ayer = (hoy - timedelta(days=1)).strftime('%Y-%m-%d')
+    
+    # VÍA DIRECTA: endpoint JSON ya conocido, sin renderizar la página
+    if endpoints is not None and url in endpoints:
+        try:
+            for evento in extraer_eventos_api(url, teatro_nombre, endpoints[url]):
+                if evento['fecha'] >= ayer and not any(e['id'] == evento['id'] for e in eventos):
+                    eventos.append(evento)
+                    print(f"   ✅ {evento['titulo'][:50]}... ({evento['fecha']} {evento['hora']}) [API]")
+        except Exception as e:
+            print(f"   ⚠️ Endpoint JSON no disponible: {e}")
+        if eventos:
+            return eventos
+        print(f"   🔄 Endpoint JSON sin eventos, redescubriendo con el navegador...")
+        del endpoints[url]
     
     try:
-        driver = crear_driver()
+        if driver_propio:
+            driver = crear_driver(capturar_red=endpoints is not None)
+        elif endpoints is not None:
+            driver.get_log('performance')  # descartar el registro de cargas anteriores
         driver.get(url)
         time.sleep(5)
         
-        html = driver.page_source
-        soup = BeautifulSoup(html, 'html.parser')
+        # Candidatos a endpoint JSON; se validan al final contra los eventos de la página
+        candidatos = []
+        if endpoints is not None:
+            try:
+                candidatos = descubrir_endpoints(driver)
+            except Exception as e:
+                print(f"   ⚠️ Sin registro de red: {e}")
         
-        # Buscar secciones
-        seccion_proximos = None
-        seccion_pasados = None
+        html = driver.page_source
         
-        for elemento in soup.find_all(['h2', 'h3']):
-            texto = elemento.get_text().lower()
-            
-            if 'próximos' in texto or 'proximos' in texto:
-                padre = elemento.find_parent(['section', 'div'])
-                if padre:
-                    seccion_proximos = padre
-                    
-            elif 'anteriormente' in texto or 'pasados' in texto or 'celebrados' in texto:
-                padre = elemento.find_parent(['section', 'div'])
-                if padre:
-                    seccion_pasados = padre
+        # VÍA RÁPIDA: datos estructurados schema.org (fecha, hora y precio exactos)
+        # El DOM (BeautifulSoup) solo se construye si hay microdata o tarjetas sin cubrir
+        datos_schema = extraer_jsonld(html)
+        soup = None
+        if RE_MICRODATA_EVENT.search(html):
+            soup = BeautifulSoup(html, 'html.parser')
+            datos_schema.extend(extraer_microdata(soup))
         
-        if seccion_proximos:
-            contenedor = seccion_proximos
-            print(f"   📍 Encontrada sección 'Próximos eventos'")
-        else:
-            contenedor = soup
-            print(f"   ⚠️ No se encontró sección específica, usando filtro por fecha")
+        urls_cubiertas = set()
+        for datos in datos_schema:
+            evento = evento_desde_schema(datos, url, teatro_nombre)
+            if not evento:
+                continue
+            urls_cubiertas.add(evento['urlCompra'])
+            if evento['fecha'] < ayer:
+                continue
+            if not any(e['id'] == evento['id'] for e in eventos):
+                eventos.append(evento)
+                print(f"   ✅ {evento['titulo'][:50]}... ({evento['fecha']} {evento['hora']}) [schema.org]")
         
-        cards = contenedor.find_all(['article', 'div'], class_=re.compile(r'event|card', re.I))
+        if eventos:
+            print(f"   📑 {len(eventos)} eventos desde datos estructurados")
         
-        hoy = datetime.now()
+        if soup is None and not hay_tarjetas_sin_cubrir(html, url, urls_cubiertas):
+            print(f"   ⏭️ Todas las tarjetas vienen en los datos estructurados")
+            eventos_card = []
+        else:
+            soup = soup or BeautifulSoup(html, 'html.parser')
+            eventos_card = extraer_tarjetas(soup, url, teatro_nombre, planes, urls_cubiertas)
         
-        for card in cards:
-            try:
-                # Verificar que NO está en sección de pasados
-                if seccion_pasados:
-                    es_pasado = False
-                    for parent in card.parents:
-                        if parent == seccion_pasados:
-                            es_pasado = True
-                            break
-                    if es_pasado:
-                        continue
-                
-                # TÍTULO
-                titulo_elem = card.find(['h2', 'h3', 'h4', 'a'], class_=re.compile(r'title|titulo|name', re.I))
-                if not titulo_elem:
-                    titulo_elem = card.find(['h2', 'h3', 'h4'])
-                
-                if not titulo_elem:
-                    continue
-                
-                titulo_raw = titulo_elem.get_text(strip=True)
-                if len(titulo_raw) < 5:
-                    continue
-                
-                titulo = limpiar_titulo(titulo_raw)
-                
-                # FECHA
-                fecha_iso = None
-                texto_card = card.get_text()
-                
-                match = re.search(r'(\d{1,2})\s*(Enero|Febrero|Marzo|Abril|Mayo|Junio|Julio|Agosto|Septiembre|Octubre|Noviembre|Diciembre)', texto_card, re.IGNORECASE)
-                if match:
-                    fecha_iso = parsear_fecha_tomaticket(match.group(1), match.group(2))
-                
-                if not fecha_iso:
-                    continue
-                
-                # Filtro: ignorar eventos pasados
-                try:
-                    fecha_evento = datetime.strptime(fecha_iso, '%Y-%m-%d')
-                    if fecha_evento < hoy - timedelta(days=1):
-                        continue
-                except:
-                    pass
-                
-                # PRECIO
-                precio = "Ver en taquilla"
-                match_precio = re.search(r'[Dd]esde\s*(\d+)\s*€', texto_card)
-                if match_precio:
-                    precio = f"Desde {match_precio.group(1)} €"
-                
-                # HORA
-                hora = "20:00"
-                
-                # URL
-                link_elem = card.find('a', href=True)
-                link = url
-                if link_elem and link_elem.get('href'):
-                    href = link_elem['href']
-                    if href.startswith('http'):
-                        link = href
-                    elif href.startswith('/'):
-                        link = 'https://www.tomaticket.es' + href
-                
-                evento = {
-                    'id': generar_id(titulo, fecha_iso, teatro_nombre),
-                    'titulo': titulo,
-                    'descripcion': '',
-                    'fecha': fecha_iso,
-                    'hora': hora,
-                    'lugar': teatro_nombre,
-                    'categoria': determinar_categoria(titulo),
-                    'precio': precio,
-                    'urlCompra': link,
-                    'esGratuito': 'FALSE',
-                    'fuente': 'TomaTicket',
-                    'activo': 'TRUE',
-                    'urlImagen': ''
-                }
-                
-                if not any(e['id'] == evento['id'] for e in eventos):
-                    eventos.append(evento)
-                    print(f"   ✅ {titulo[:50]}... ({fecha_iso})")
-                
-            except Exception as e:
+        for evento in eventos_card:
+            # Filtro: ignorar eventos pasados
+            if evento['fecha'] < ayer:
                 continue
+            if not any(e['id'] == evento['id'] for e in eventos):
+                eventos.append(evento)
+                print(f"   ✅ {evento['titulo'][:50]}... ({evento['fecha']})")
+        
+        # ENDPOINT JSON: solo se guarda si sus items coinciden con lo que muestra la página
+        if candidatos:
+            endpoint = elegir_endpoint(candidatos, eventos, url, teatro_nombre)
+            if endpoint:
+                endpoints[url] = endpoint
+                print(f"   🛰️ Endpoint JSON descubierto: {endpoint['url'][:70]}")
+            else:
+                print(f"   ⚠️ Ningún JSON de la red coincide con los eventos de la página")
         
     except Exception as e:
         print(f"   ❌ Error: {e}")
     finally:
-        if driver:
+        if driver_propio and driver:
             driver.quit()
     
     return eventos
 
+# ======================================================================
+# MODO VIGILANCIA (python extractor_a_sheets.py --vigilar)
+# ======================================================================
+
+def huella_eventos(eventos):
+    """Huella del listado de una fuente: cambia si aparece, desaparece o cambia un evento"""
+    partes = sorted(f"{e['id']}|{e.get('hora', '')}|{e.get('precio', '')}|{e.get('urlCompra', '')}" for e in eventos)
+    return hashlib.md5('\n'.join(partes).encode()).hexdigest()
+
+def limitar_intervalo(segundos):
+    return max(INTERVALO_MINIMO_MIN * 60, min(INTERVALO_MAXIMO_MIN * 60, segundos))
+
+def actualizar_intervalo(estado, hubo_cambio, ahora):
+    """
+    Aprende cada cuánto cambia la fuente (media móvil del tiempo entre cambios)
+    y sondea a una fracción de ese tiempo. Si lleva más tiempo quieta de lo
+    habitual, el intervalo crece con ese silencio.
+    """
+    transcurrido = ahora - estado['ultimoCambio']
+    if hubo_cambio:
+        estado['mediaEntreCambios'] = (SUAVIZADO_CAMBIOS * transcurrido
+                                       + (1 - SUAVIZADO_CAMBIOS) * estado['mediaEntreCambios'])
+        estado['ultimoCambio'] = ahora
+        transcurrido = 0
+    referencia = max(estado['mediaEntreCambios'], transcurrido)
+    estado['intervalo'] = limitar_intervalo(referencia * FRACCION_SONDEO)
+    estado['proximo'] = ahora + estado['intervalo']
+
+def driver_vivo(driver):
+    try:
+        driver.title
+        return True
+    except Exception:
+        return False
+
+def vigilar():
+    """
+    Proceso de larga duración: un Chrome y una conexión a Sheets calientes,
+    sondeo adaptativo por fuente y solo deltas al Sheet (escribir_eventos).
+    Cada REESCRITURA_COMPLETA_HORAS se pasa el archivado, que reescribe la
+    hoja ordenada si quita filas.
+    En el servidor nadie publica imagenes/, exportaciones/ ni el índice, así que
+    no se generan (urlImagen apuntaría a ficheros que no existen). Las huellas
+    de huellas_campos.json son locales: con el modo vigilancia activo hay que
+    desactivar el cron de GitHub Actions, o cada proceso tomaría las escrituras
+    del otro por ediciones manuales.
+    """
+    global PROCESAR_IMAGENES, PUBLICAR_INDICE_BUSQUEDA, EXPORTAR_CALENDARIOS
+    PROCESAR_IMAGENES = PUBLICAR_INDICE_BUSQUEDA = EXPORTAR_CALENDARIOS = False
+    
+    print("=" * 60)
+    print("👀 MODO VIGILANCIA")
+    print("=" * 60)
+    print("   ℹ️ Imágenes, índice y calendarios desactivados (no se publican desde aquí)")
+    print("   ⚠️ Desactiva el cron de GitHub Actions mientras esto esté en marcha")
+    
+    hoja = conectar_sheets()
+    planes = cargar_planes()
+    endpoints = cargar_endpoints() if USAR_API_JSON else None
+    driver = crear_driver(capturar_red=USAR_API_JSON)
+    
+    ahora = time.time()
+    estados = {
+        url: {
+            'teatro': teatro,
+            'huella': None,
+            'ultimoCambio': ahora,
+            'mediaEntreCambios': MEDIA_INICIAL_CAMBIOS_HORAS * 3600,
+            'intervalo': 0,
+            'proximo': ahora,
+        }
+        for teatro, url in TOMATICKET_URLS.items()
+    }
+    proxima_reescritura = ahora
+    
+    try:
+        while True:
+            ahora = time.time()
+            
+            if ahora >= proxima_reescritura:
+                print(f"\n🔁 Pasada de archivado ({datetime.now():%Y-%m-%d %H:%M})")
+                escribir_eventos(hoja, [], obtener_eventos_existentes(hoja))
+                proxima_reescritura = ahora + REESCRITURA_COMPLETA_HORAS * 3600
+            
+            pendientes = [url for url, estado in estados.items() if estado['proximo'] <= ahora]
+            if pendientes:
+                if not driver_vivo(driver):
+                    print("   🔄 Reiniciando Chrome...")
+                    try:
+                        driver.quit()
+                    except Exception:
+                        pass
+                    driver = crear_driver(capturar_red=USAR_API_JSON)
+            
+            for url in pendientes:
+                estado = estados[url]
+                eventos = extraer_eventos_tomaticket(url, estado['teatro'], planes, driver, endpoints)
+                huella = huella_eventos(eventos)
+                
+                # Una lista vacía tras tener eventos suele ser un fallo de carga, no un cambio
+                primera_vez = estado['huella'] is None
+                hubo_cambio = not primera_vez and huella != estado['huella'] and bool(eventos)
+                if eventos or primera_vez:
+                    estado['huella'] = huella
+                
+                if hubo_cambio or primera_vez:
+                    # Se relee el Sheet justo antes para respetar ediciones manuales
+                    eventos_existentes = obtener_eventos_existentes(hoja)
+                    if PROCESAR_IMAGENES:
+                        procesar_imagenes_pendientes(eventos, eventos_existentes)
+                    escribir_eventos(hoja, eventos, eventos_existentes)
+                    guardar_planes(planes)
+                    if endpoints is not None:
+                        guardar_endpoints(endpoints)
+                
+                actualizar_intervalo(estado, hubo_cambio, time.time())
+                print(f"   ⏱️ {estado['teatro']}: {'cambió' if hubo_cambio else 'sin cambios'}, "
+                      f"próximo sondeo en {estado['intervalo'] / 60:.0f} min")
+            
+            siguiente = min(min(e['proximo'] for e in estados.values()), proxima_reescritura)
+            time.sleep(max(1, siguiente - time.time()))
+    except KeyboardInterrupt:
+        print("\n👋 Vigilancia detenida")
+    finally:
+        guardar_planes(planes)
+        if endpoints is not None:
+            guardar_endpoints(endpoints)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
 # ======================================================================
 # MAIN
 # ======================================================================
 
+def eventos_sin_imagen(eventos, eventos_existentes):
+    """
+    Eventos a los que hay que buscar cartel: nuevos o cuya fila tiene urlImagen
+    vacía. Los que ya tienen imagen en el Sheet no se descargan.
+    """
+    if eventos_existentes is None:
+        return []
+    return [e for e in eventos if not eventos_existentes.get(e['id'], {}).get('urlImagen')]
+
+def procesar_imagenes_pendientes(eventos, eventos_existentes):
+    """Imágenes solo de los eventos que las necesitan (no bloquea la escritura si falla)"""
+    pendientes = eventos_sin_imagen(eventos, eventos_existentes)
+    if not pendientes:
+        return
+    try:
+        procesar_imagenes(pendientes, set(TOMATICKET_URLS.values()))
+    except Exception as e:
+        print(f"   ⚠️ Error procesando imágenes: {e}")
+
 def main():
+    if '--vigilar' in sys.argv[1:]:
+        vigilar()
+        return
+    
     print("=" * 60)
     print("🎭 EXTRACTOR DE EVENTOS → GOOGLE SHEETS")
     print("=" * 60)
@@ -488,7 +1543,8 @@ def main():
     # Mostrar configuración actual
     print(f"\n⚙️ CONFIGURACIÓN ACTUAL:")
     print(f"   🗑️ Borrado automático: {'✅ ACTIVADO' if BORRAR_EVENTOS_PASADOS else '❌ DESACTIVADO'}")
-    if BORRAR_EVENTOS_PASADOS:
+    print(f"   📦 Archivado por temporada: {'✅ ACTIVADO' if ARCHIVAR_EVENTOS_PASADOS else '❌ DESACTIVADO'}")
+    if BORRAR_EVENTOS_PASADOS or ARCHIVAR_EVENTOS_PASADOS:
         print(f"   📅 Días de gracia: {DIAS_GRACIA_BORRADO}")
     print("")
     
@@ -499,13 +1555,22 @@ def main():
     eventos_existentes = obtener_eventos_existentes(hoja)
     
     # Extraer eventos de TomaTicket
+    planes = cargar_planes()
+    endpoints = cargar_endpoints() if USAR_API_JSON else None
     todos_eventos = []
     for teatro, url in TOMATICKET_URLS.items():
-        eventos = extraer_eventos_tomaticket(url, teatro)
+        eventos = extraer_eventos_tomaticket(url, teatro, planes, endpoints=endpoints)
         todos_eventos.extend(eventos)
+    guardar_planes(planes)
+    if endpoints is not None:
+        guardar_endpoints(endpoints)
     
     print(f"\n📦 Total extraídos de TomaTicket: {len(todos_eventos)}")
     
+    # Imágenes (no bloquea la escritura si falla)
+    if PROCESAR_IMAGENES:
+        procesar_imagenes_pendientes(todos_eventos, eventos_existentes)
+    
     # Escribir en Sheets
     escribir_eventos(hoja, todos_eventos, eventos_existentes)
     
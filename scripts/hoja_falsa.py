@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HOJA DE GOOGLE SHEETS FALSA (LOCAL)
+===================================
+Sustituto en fichero de la parte de gspread.Worksheet que usa el extractor,
+para probar conectar/leer/escribir sin credenciales y medir el rendimiento.
+
+    hoja = HojaFalsa('hoja_local.json', latencia=0.1, cuota_por_minuto=60)
+    eventos = obtener_eventos_existentes(hoja)
+    escribir_eventos(hoja, nuevos, eventos)
+    print(hoja.estadisticas())
+
+Simula la latencia por llamada y los errores 429 de cuota (por ventana de
+un minuto, como la API real, y/o aleatorios con `prob_error_cuota`).
+"""
+
+from collections import Counter, deque
+import json
+import os
+import random
+import re
+import time
+
+
+try:
+    from gspread.exceptions import WorksheetNotFound as HojaNoEncontrada
+except ImportError:
+    class HojaNoEncontrada(Exception):
+        """Equivalente a gspread.exceptions.WorksheetNotFound"""
+
+
+class ErrorCuota(Exception):
+    """Equivalente al APIError 429 'Quota exceeded' de gspread"""
+
+
+class LibroFalso:
+    """Lo mínimo de gspread.Spreadsheet: worksheet() y add_worksheet()"""
+
+    def __init__(self, directorio=None, **opciones):
+        self.directorio = directorio
+        self.opciones = opciones
+        self.hojas = {}
+        # La cuota de la API es por proyecto, no por hoja: ventana compartida
+        self.ventana = deque()
+
+    def _ruta(self, titulo):
+        if not self.directorio:
+            return None
+        return os.path.join(self.directorio, re.sub(r'[^\w-]+', '_', titulo) + '.json')
+
+    def worksheet(self, titulo):
+        if titulo not in self.hojas:
+            ruta = self._ruta(titulo)
+            if not ruta or not os.path.exists(ruta):
+                raise HojaNoEncontrada(titulo)
+            self.hojas[titulo] = HojaFalsa(ruta, titulo=titulo, libro=self, **self.opciones)
+        return self.hojas[titulo]
+
+    def add_worksheet(self, title, rows=100, cols=26):
+        hoja = HojaFalsa(self._ruta(title), titulo=title, libro=self, **self.opciones)
+        hoja._guardar()
+        self.hojas[title] = hoja
+        return hoja
+
+
+class HojaFalsa:
+    """
+    Subconjunto de gspread.Worksheet: get_all_values, get_all_records, col_values,
+    clear, update, append_row, append_rows, insert_rows, delete_rows y batch_update.
+    Los datos son una lista de filas (listas de str), guardada en JSON si hay ruta.
+    """
+
+    def __init__(self, ruta=None, titulo='Eventos', libro=None,
+                 latencia=0.0, cuota_por_minuto=None, prob_error_cuota=0.0, semilla=None):
+        self.ruta = ruta
+        self.title = titulo
+        self.spreadsheet = libro or LibroFalso(os.path.dirname(os.path.abspath(ruta)) if ruta else None,
+                                               latencia=latencia,
+                                               cuota_por_minuto=cuota_por_minuto,
+                                               prob_error_cuota=prob_error_cuota,
+                                               semilla=semilla)
+        self.spreadsheet.hojas.setdefault(titulo, self)
+        self.latencia = latencia
+        self.cuota_por_minuto = cuota_por_minuto
+        self.prob_error_cuota = prob_error_cuota
+        self.azar = random.Random(semilla)
+
+        self.llamadas = Counter()
+        self.errores_cuota = 0
+        self.bytes_leidos = 0
+        self.bytes_escritos = 0
+        self._ventana = self.spreadsheet.ventana
+
+        self.filas = []
+        if ruta and os.path.exists(ruta):
+            with open(ruta, encoding='utf-8') as f:
+                self.filas = json.load(f)
+
+    # ------------------------------------------------------------------
+    # Simulación de la API
+    # ------------------------------------------------------------------
+
+    def _llamada(self, metodo):
+        """Cuenta la llamada, aplica la latencia y lanza 429 si toca"""
+        self.llamadas[metodo] += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+        ahora = time.monotonic()
+        if self.cuota_por_minuto:
+            while self._ventana and ahora - self._ventana[0] > 60:
+                self._ventana.popleft()
+            if len(self._ventana) >= self.cuota_por_minuto:
+                self.errores_cuota += 1
+                raise ErrorCuota(f"APIError: [429]: Quota exceeded ({metodo})")
+            self._ventana.append(ahora)
+
+        if self.prob_error_cuota and self.azar.random() < self.prob_error_cuota:
+            self.errores_cuota += 1
+            raise ErrorCuota(f"APIError: [429]: Quota exceeded ({metodo})")
+
+    def _guardar(self):
+        if not self.ruta:
+            return
+        temporal = self.ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self.filas, f, ensure_ascii=False)
+        os.replace(temporal, self.ruta)
+
+    @staticmethod
+    def _tamano(valores):
+        return len(json.dumps(valores, ensure_ascii=False).encode('utf-8'))
+
+    @staticmethod
+    def _celda(a1):
+        """'B3' → (fila 2, columna 1), base 0. Acepta rangos 'B3:D9' (usa el inicio)."""
+        match = re.match(r'^([A-Za-z]+)(\d+)', a1.split('!')[-1])
+        if not match:
+            raise ValueError(f"Rango no soportado: {a1}")
+        columna = 0
+        for letra in match.group(1).upper():
+            columna = columna * 26 + (ord(letra) - ord('A') + 1)
+        return int(match.group(2)) - 1, columna - 1
+
+    def _escribir_bloque(self, fila0, col0, valores):
+        for i, valores_fila in enumerate(valores):
+            indice = fila0 + i
+            while len(self.filas) <= indice:
+                self.filas.append([])
+            fila = self.filas[indice]
+            if len(fila) < col0 + len(valores_fila):
+                fila.extend([''] * (col0 + len(valores_fila) - len(fila)))
+            for j, valor in enumerate(valores_fila):
+                fila[col0 + j] = '' if valor is None else str(valor)
+
+    # ------------------------------------------------------------------
+    # API de gspread.Worksheet
+    # ------------------------------------------------------------------
+
+    def get_all_values(self):
+        self._llamada('get_all_values')
+        valores = [list(fila) for fila in self.filas]
+        self.bytes_leidos += self._tamano(valores)
+        return valores
+
+    def get_all_records(self):
+        self._llamada('get_all_records')
+        if not self.filas:
+            return []
+        cabecera = self.filas[0]
+        registros = [
+            {clave: (fila[i] if i < len(fila) else '') for i, clave in enumerate(cabecera)}
+            for fila in self.filas[1:]
+        ]
+        self.bytes_leidos += self._tamano(self.filas)
+        return registros
+
+    def col_values(self, columna):
+        self._llamada('col_values')
+        valores = [fila[columna - 1] for fila in self.filas if len(fila) >= columna and fila[columna - 1] != '']
+        self.bytes_leidos += self._tamano(valores)
+        return valores
+
+    def clear(self):
+        self._llamada('clear')
+        self.filas = []
+        self._guardar()
+
+    def update(self, range_name, values=None, value_input_option=None, **kwargs):
+        # gspread < 6 acepta (rango, valores); gspread 6 también (valores, rango)
+        if isinstance(range_name, list):
+            range_name, values = values or 'A1', range_name
+        self._llamada('update')
+        self.bytes_escritos += self._tamano(values)
+        fila0, col0 = self._celda(range_name)
+        self._escribir_bloque(fila0, col0, values)
+        self._guardar()
+
+    def append_row(self, values, value_input_option=None, **kwargs):
+        self._llamada('append_row')
+        self.bytes_escritos += self._tamano(values)
+        self._escribir_bloque(len(self.filas), 0, [values])
+        self._guardar()
+
+    def append_rows(self, values, value_input_option=None, **kwargs):
+        self._llamada('append_rows')
+        self.bytes_escritos += self._tamano(values)
+        self._escribir_bloque(len(self.filas), 0, values)
+        self._guardar()
+
+    def insert_rows(self, values, row=1, value_input_option=None, **kwargs):
+        """Inserta las filas antes de la fila `row` (base 1), desplazando las de debajo"""
+        self._llamada('insert_rows')
+        self.bytes_escritos += self._tamano(values)
+        self.filas[row - 1:row - 1] = [['' if v is None else str(v) for v in fila] for fila in values]
+        self._guardar()
+
+    def delete_rows(self, start_index, end_index=None):
+        """Borra las filas start_index..end_index (base 1, ambas incluidas), subiendo las de debajo"""
+        self._llamada('delete_rows')
+        del self.filas[start_index - 1:(end_index or start_index)]
+        self._guardar()
+
+    def batch_update(self, data, value_input_option=None, **kwargs):
+        """data = [{'range': 'B3', 'values': [[...]]}, ...] en una sola llamada"""
+        self._llamada('batch_update')
+        for bloque in data:
+            self.bytes_escritos += self._tamano(bloque['values'])
+            fila0, col0 = self._celda(bloque['range'])
+            self._escribir_bloque(fila0, col0, bloque['values'])
+        self._guardar()
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    def estadisticas(self):
+        return {
+            'llamadas': sum(self.llamadas.values()),
+            'porMetodo': dict(self.llamadas),
+            'erroresCuota': self.errores_cuota,
+            'bytesLeidos': self.bytes_leidos,
+            'bytesEscritos': self.bytes_escritos,
+        }
+
+    def reiniciar_estadisticas(self):
+        self.llamadas.clear()
+        self.errores_cuota = 0
+        self.bytes_leidos = 0
+        self.bytes_escritos = 0
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PIPELINE DE IMÁGENES DE EVENTOS
+===============================
+Descarga los carteles de los eventos, los deduplica por contenido y genera
+miniaturas WebP en un directorio direccionado por contenido, listo para
+servir como estático (GitHub Pages).
+
+- Una imagen sin cambios no se vuelve a descargar (GET condicional con
+  ETag / Last-Modified) ni a recodificar (el nombre del fichero es su hash).
+- Las páginas de detalle solo se consultan una vez para sacar su og:image.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from urllib.parse import urljoin
+from io import BytesIO
+from PIL import Image, ImageOps
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+# ======================================================================
+# CONFIGURACIÓN
+# ======================================================================
+
+# Directorio publicado (raíz del repo) y URL pública equivalente
+DIRECTORIO_IMAGENES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'imagenes')
+URL_BASE_IMAGENES = "https://hctop.github.io/almansa-eventos/imagenes/"
+MANIFIESTO = "manifiesto.json"
+
+# Anchos (px) que usa la app: lista y ficha del evento
+ANCHOS_MINIATURA = [160, 480]
+# Ancho que se guarda en la columna urlImagen del Sheet
+ANCHO_URL_IMAGEN = 480
+CALIDAD_WEBP = 80
+
+MAX_DESCARGAS_PARALELAS = 8
+TIMEOUT_DESCARGA = 20
+MAX_BYTES_IMAGEN = 10 * 1024 * 1024
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+RE_OG_IMAGE = re.compile(
+    r'<meta[^>]+(?:property|name)=["\'](?:og:image|twitter:image)["\'][^>]*content=["\']([^"\']+)["\']'
+    r'|<meta[^>]+content=["\']([^"\']+)["\'][^>]*(?:property|name)=["\'](?:og:image|twitter:image)["\']',
+    re.I
+)
+
+# ======================================================================
+# UTILIDADES
+# ======================================================================
+
+def url_desde_card(card, url_base):
+    """Saca la URL del cartel de una tarjeta de evento (src, lazy-load o srcset)"""
+    img = card.find('img')
+    if not img:
+        return ''
+    for atributo in ('data-src', 'data-lazy-src', 'data-original', 'src'):
+        valor = (img.get(atributo) or '').strip()
+        if valor and not valor.startswith('data:'):
+            return urljoin(url_base, valor)
+    srcset = (img.get('srcset') or img.get('data-srcset') or '').strip()
+    if srcset:
+        # La última entrada del srcset suele ser la de mayor resolución
+        return urljoin(url_base, srcset.split(',')[-1].split()[0])
+    return ''
+
+def nombre_miniatura(hash_imagen, ancho):
+    return f"{hash_imagen}_{ancho}.webp"
+
+def url_publica(hash_imagen, ancho=ANCHO_URL_IMAGEN):
+    return URL_BASE_IMAGENES + nombre_miniatura(hash_imagen, ancho)
+
+def miniaturas_completas(hash_imagen):
+    return all(
+        os.path.exists(os.path.join(DIRECTORIO_IMAGENES, nombre_miniatura(hash_imagen, ancho)))
+        for ancho in ANCHOS_MINIATURA
+    )
+
+def cargar_manifiesto():
+    ruta = os.path.join(DIRECTORIO_IMAGENES, MANIFIESTO)
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            manifiesto = json.load(f)
+    except (OSError, ValueError):
+        manifiesto = {}
+    manifiesto.setdefault('origenes', {})
+    manifiesto.setdefault('paginas', {})
+    return manifiesto
+
+def guardar_manifiesto(manifiesto):
+    ruta = os.path.join(DIRECTORIO_IMAGENES, MANIFIESTO)
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(temporal, ruta)
+
+# ======================================================================
+# DESCARGA
+# ======================================================================
+
+def buscar_imagen_en_detalle(url_pagina):
+    """
+    Lee la página de detalle y devuelve su og:image (regex, sin parsear el DOM).
+    '' si la página no tiene og:image; None si no se pudo leer (se reintenta).
+    """
+    try:
+        peticion = Request(url_pagina, headers={'User-Agent': USER_AGENT})
+        with urlopen(peticion, timeout=TIMEOUT_DESCARGA) as respuesta:
+            html = respuesta.read(512 * 1024).decode('utf-8', errors='replace')
+    except Exception as e:
+        print(f"      ⚠️ Sin imagen en {url_pagina[:60]}: {e}")
+        return None
+    match = RE_OG_IMAGE.search(html)
+    if match:
+        return urljoin(url_pagina, match.group(1) or match.group(2))
+    return ''
+
+def descargar_imagen(url_imagen, entrada_previa):
+    """
+    Descarga una imagen con GET condicional.
+    Devuelve (datos, cabeceras); datos es None si no ha cambiado (304).
+    """
+    cabeceras = {'User-Agent': USER_AGENT}
+    # Solo se pide condicional si las miniaturas siguen en disco
+    if entrada_previa and miniaturas_completas(entrada_previa.get('hash', '')):
+        if entrada_previa.get('etag'):
+            cabeceras['If-None-Match'] = entrada_previa['etag']
+        if entrada_previa.get('lastModified'):
+            cabeceras['If-Modified-Since'] = entrada_previa['lastModified']
+
+    try:
+        with urlopen(Request(url_imagen, headers=cabeceras), timeout=TIMEOUT_DESCARGA) as respuesta:
+            datos = respuesta.read(MAX_BYTES_IMAGEN + 1)
+            if len(datos) > MAX_BYTES_IMAGEN:
+                raise ValueError("imagen demasiado grande")
+            return datos, {
+                'etag': respuesta.headers.get('ETag', ''),
+                'lastModified': respuesta.headers.get('Last-Modified', ''),
+            }
+    except HTTPError as e:
+        if e.code == 304:
+            return None, {}
+        raise
+
+# ======================================================================
+# MINIATURAS
+# ======================================================================
+
+def generar_miniaturas(hash_imagen, datos):
+    """Genera las miniaturas WebP que falten para este contenido"""
+    os.makedirs(DIRECTORIO_IMAGENES, exist_ok=True)
+    imagen = ImageOps.exif_transpose(Image.open(BytesIO(datos)))
+    if imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if 'A' in imagen.getbands() else 'RGB')
+
+    for ancho in ANCHOS_MINIATURA:
+        ruta = os.path.join(DIRECTORIO_IMAGENES, nombre_miniatura(hash_imagen, ancho))
+        if os.path.exists(ruta):
+            continue
+        copia = imagen
+        if imagen.width > ancho:
+            alto = max(1, round(imagen.height * ancho / imagen.width))
+            copia = imagen.resize((ancho, alto), Image.LANCZOS)
+        # Temporal propio: dos orígenes con el mismo contenido pueden llegar a la vez
+        descriptor, temporal = tempfile.mkstemp(dir=DIRECTORIO_IMAGENES, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                copia.save(f, 'WEBP', quality=CALIDAD_WEBP, method=6)
+            os.replace(temporal, ruta)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+def procesar_origen(url_imagen, entrada_previa):
+    """Descarga + hash + miniaturas de un origen. Devuelve la nueva entrada del manifiesto."""
+    datos, cabeceras = descargar_imagen(url_imagen, entrada_previa)
+    if datos is None:
+        return entrada_previa
+
+    hash_imagen = hashlib.sha256(datos).hexdigest()[:20]
+    if not miniaturas_completas(hash_imagen):
+        generar_miniaturas(hash_imagen, datos)
+    return {'hash': hash_imagen, **cabeceras}
+
+# ======================================================================
+# PIPELINE
+# ======================================================================
+
+def procesar_imagenes(eventos, urls_recinto=()):
+    """
+    Rellena 'urlImagen' de los eventos con la miniatura publicada.
+    Usa 'imagenOrigen' (imagen de la tarjeta) y, si falta, el og:image de urlCompra.
+    `urls_recinto` son las páginas de listado: si urlCompra es una de ellas (la
+    tarjeta no tenía enlace) su og:image es la foto genérica del recinto, no un cartel.
+    """
+    print(f"\n🖼️ Procesando imágenes...")
+    os.makedirs(DIRECTORIO_IMAGENES, exist_ok=True)
+    manifiesto = cargar_manifiesto()
+    origenes = manifiesto['origenes']
+    paginas = manifiesto['paginas']
+
+    # PASO 1: páginas de detalle para los eventos sin imagen en la tarjeta
+    # Las páginas ya consultadas sin og:image quedan con '' y no se vuelven a pedir
+    pendientes = sorted({
+        e['urlCompra'] for e in eventos
+        if not e.get('imagenOrigen') and e.get('urlCompra')
+        and e['urlCompra'] not in paginas and e['urlCompra'] not in urls_recinto
+    })
+    if pendientes:
+        with ThreadPoolExecutor(max_workers=MAX_DESCARGAS_PARALELAS) as pool:
+            for url_pagina, url_imagen in zip(pendientes, pool.map(buscar_imagen_en_detalle, pendientes)):
+                if url_imagen is not None:
+                    paginas[url_pagina] = url_imagen
+
+    for evento in eventos:
+        if not evento.get('imagenOrigen') and evento.get('urlCompra') not in urls_recinto:
+            evento['imagenOrigen'] = paginas.get(evento.get('urlCompra', ''), '')
+
+    # PASO 2: descarga concurrente de cada origen distinto
+    urls = sorted({e['imagenOrigen'] for e in eventos if e.get('imagenOrigen')})
+    descargadas = 0
+
+    def tarea(url_imagen):
+        try:
+            return procesar_origen(url_imagen, origenes.get(url_imagen))
+        except Exception as e:
+            print(f"      ⚠️ Error con imagen {url_imagen[:60]}: {e}")
+            return origenes.get(url_imagen)
+
+    with ThreadPoolExecutor(max_workers=MAX_DESCARGAS_PARALELAS) as pool:
+        for url_imagen, entrada in zip(urls, pool.map(tarea, urls)):
+            if entrada and entrada is not origenes.get(url_imagen):
+                descargadas += 1
+            if entrada:
+                origenes[url_imagen] = entrada
+
+    # PASO 3: asignar URL pública
+    con_imagen = 0
+    for evento in eventos:
+        entrada = origenes.get(evento.get('imagenOrigen', ''))
+        if entrada and entrada.get('hash'):
+            evento['urlImagen'] = url_publica(entrada['hash'])
+            con_imagen += 1
+
+    guardar_manifiesto(manifiesto)
+    hashes = {e['hash'] for e in origenes.values() if e.get('hash')}
+    print(f"   ✅ {con_imagen}/{len(eventos)} eventos con imagen "
+          f"({descargadas} descargadas, {len(hashes)} imágenes únicas)")
+    return eventos
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ÍNDICE DE BÚSQUEDA OFFLINE
+==========================
+Genera un índice invertido compacto de los eventos para que la app Android
+busque sin recorrer la lista entera.
+
+Normalización (la app debe aplicar la misma a la consulta):
+- minúsculas y sin acentos (NFKD quitando marcas: "Música" → "musica")
+- se separa por cualquier carácter no alfanumérico
+- se descartan las palabras vacías de PALABRAS_VACIAS
+- cada palabra se indexa tal cual y derivada (raíz), p. ej. "teatros" → "teatros" y "teatr"
+
+Formato de indice_busqueda.json:
+    {
+      "version": 1,
+      "docs": [[id, titulo, fecha, hora, lugar, categoria], ...],   # ordenados por fecha
+      "terminos": ["alicia", "almans", ...],                          # ordenados: prefijos por búsqueda binaria
+      "postings": [[0, 3, 1], ...]                                    # índices de docs en delta
+    }
+
+Al estar los docs ordenados por fecha, cada posting sale ya ordenado por fecha.
+Solo se vuelven a tokenizar los eventos cuya huella ha cambiado
+(estado en indice_estado.json).
+"""
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+# ======================================================================
+# CONFIGURACIÓN
+# ======================================================================
+
+# El índice se publica en la raíz, junto a imagenes/ y exportaciones/;
+# el estado interno se queda en scripts/ con el resto de ficheros de trabajo
+DIRECTORIO_SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+ARCHIVO_INDICE = os.path.join(DIRECTORIO_SCRIPTS, '..', 'indice_busqueda.json')
+ARCHIVO_ESTADO = os.path.join(DIRECTORIO_SCRIPTS, 'indice_estado.json')
+
+CAMPOS_INDEXADOS = ['titulo', 'descripcion', 'lugar', 'categoria']
+
+PALABRAS_VACIAS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los',
+    'para', 'por', 'se', 'su', 'un', 'una', 'y', 'o', 'que', 'the', 'of',
+}
+
+# Sufijos de la derivación ligera, del más largo al más corto
+SUFIJOS = [
+    'aciones', 'amientos', 'imientos', 'amiento', 'imiento', 'idades', 'mente',
+    'acion', 'idad', 'ismos', 'istas', 'ismo', 'ista', 'ables', 'ibles', 'able', 'ible',
+    'ores', 'ales', 'es', 'os', 'as', 'or', 'al', 'o', 'a', 'e', 's',
+]
+LONGITUD_MINIMA_RAIZ = 3
+
+RE_PALABRA = re.compile(r'[a-z0-9]+')
+
+# ======================================================================
+# NORMALIZACIÓN
+# ======================================================================
+
+def plegar(texto):
+    """Minúsculas y sin acentos: 'Música' → 'musica'"""
+    descompuesto = unicodedata.normalize('NFKD', str(texto).lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+def derivar(palabra):
+    """Derivación ligera para español: quita un sufijo dejando al menos 3 letras"""
+    if palabra.isdigit():
+        return palabra
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= LONGITUD_MINIMA_RAIZ:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+def tokenizar(evento):
+    """Términos de un evento: cada palabra plegada y su raíz"""
+    terminos = set()
+    for campo in CAMPOS_INDEXADOS:
+        for palabra in RE_PALABRA.findall(plegar(evento.get(campo, ''))):
+            if palabra in PALABRAS_VACIAS or len(palabra) < 2:
+                continue
+            terminos.add(palabra)
+            terminos.add(derivar(palabra))
+    return sorted(terminos)
+
+def huella_evento(evento):
+    texto = '\x1f'.join(str(evento.get(c, '')) for c in CAMPOS_INDEXADOS + ['fecha', 'hora'])
+    return hashlib.md5(texto.encode()).hexdigest()[:12]
+
+# ======================================================================
+# ESTADO
+# ======================================================================
+
+def cargar_json(ruta, por_defecto):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return por_defecto
+
+def guardar_json(ruta, datos, compacto=False):
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        if compacto:
+            json.dump(datos, f, ensure_ascii=False, separators=(',', ':'))
+        else:
+            json.dump(datos, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(temporal, ruta)
+
+# ======================================================================
+# CONSTRUCCIÓN
+# ======================================================================
+
+def actualizar_estado(estado, eventos, conservar_pasados_desde=None):
+    """
+    Actualiza el estado {id: {h, t, d}} con los eventos actuales.
+    Solo se tokenizan los eventos nuevos o con huella distinta.
+    Si conservar_pasados_desde (YYYY-MM-DD) se indica, los eventos que ya no
+    están pero son anteriores a esa fecha se mantienen (están archivados).
+    Devuelve el número de eventos retokenizados.
+    """
+    actuales = set()
+    retokenizados = 0
+    for evento in eventos:
+        evento_id = evento.get('id', '')
+        if not evento_id:
+            continue
+        actuales.add(evento_id)
+        huella = huella_evento(evento)
+        entrada = estado.get(evento_id)
+        if entrada and entrada['h'] == huella:
+            continue
+        estado[evento_id] = {
+            'h': huella,
+            't': tokenizar(evento),
+            'd': [evento_id] + [str(evento.get(c, '')) for c in ('titulo', 'fecha', 'hora', 'lugar', 'categoria')],
+        }
+        retokenizados += 1
+
+    for evento_id in list(estado):
+        if evento_id in actuales:
+            continue
+        fecha = estado[evento_id]['d'][2]
+        if conservar_pasados_desde is None or not fecha or fecha >= conservar_pasados_desde:
+            del estado[evento_id]
+
+    return retokenizados
+
+def construir_indice(estado):
+    """Monta docs ordenados por fecha, términos ordenados y postings en delta"""
+    ids = sorted(estado, key=lambda i: (estado[i]['d'][2] or '9999-99-99', i))
+    posicion = {evento_id: n for n, evento_id in enumerate(ids)}
+
+    postings = {}
+    for evento_id in ids:
+        for termino in estado[evento_id]['t']:
+            postings.setdefault(termino, []).append(posicion[evento_id])
+
+    terminos = sorted(postings)
+    deltas = []
+    for termino in terminos:
+        lista = postings[termino]
+        deltas.append([lista[0]] + [b - a for a, b in zip(lista, lista[1:])])
+
+    return {
+        'version': 1,
+        'docs': [estado[i]['d'] for i in ids],
+        'terminos': terminos,
+        'postings': deltas,
+    }
+
+def publicar_indice(eventos, conservar_pasados_desde=None):
+    """Actualiza el estado y escribe el índice si ha cambiado algo"""
+    print(f"\n🔎 Actualizando índice de búsqueda...")
+    estado = cargar_json(ARCHIVO_ESTADO, {})
+    antes = len(estado)
+    retokenizados = actualizar_estado(estado, eventos, conservar_pasados_desde)
+
+    if retokenizados == 0 and len(estado) == antes and os.path.exists(ARCHIVO_INDICE):
+        print(f"   ✅ Sin cambios ({len(estado)} eventos indexados)")
+        return
+
+    indice = construir_indice(estado)
+    guardar_json(ARCHIVO_INDICE, indice, compacto=True)
+    guardar_json(ARCHIVO_ESTADO, estado)
+    print(f"   ✅ {len(estado)} eventos, {len(indice['terminos'])} términos "
+          f"({retokenizados} retokenizados)")
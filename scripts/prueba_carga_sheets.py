@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PRUEBA DE CARGA DEL ESCRITOR DE SHEETS
+======================================
+Ejecuta el ciclo leer → combinar → escribir de extractor_a_sheets.py contra
+la hoja falsa local con 100, 10.000 y 50.000 filas, y muestra llamadas a la
+API, bytes y tiempo. No necesita credenciales.
+
+    cd scripts
+    python prueba_carga_sheets.py
+    python prueba_carga_sheets.py --filas 100 1000 --latencia 0.2 --cuota 60
+    python prueba_carga_sheets.py --pasados 0 --extraidos 400   # más huecos de inserción
+"""
+
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import extractor_a_sheets as extractor
+from hoja_falsa import HojaFalsa
+
+# ======================================================================
+# DATOS SINTÉTICOS
+# ======================================================================
+
+LUGARES = ["Teatro Regio", "Teatro Principal"]
+TITULOS = ["Concierto de la Banda", "Obra de teatro", "Cuentacuentos infantil",
+           "Monólogo de humor", "Ciclo de cine", "Gala de danza"]
+
+def evento_sintetico(n, dias):
+    fecha = (datetime.now() + timedelta(days=dias)).strftime('%Y-%m-%d')
+    titulo = f"{TITULOS[n % len(TITULOS)]} {n}"
+    lugar = LUGARES[n % len(LUGARES)]
+    return {
+        'id': extractor.generar_id(titulo, fecha, lugar),
+        'titulo': titulo,
+        'descripcion': f"Descripción del evento {n}",
+        'fecha': fecha,
+        'hora': '20:00',
+        'lugar': lugar,
+        'categoria': extractor.determinar_categoria(titulo),
+        'precio': f"Desde {5 + n % 20} €",
+        'urlCompra': f"https://www.tomaticket.es/es-es/entradas-evento-{n}",
+        'esGratuito': 'FALSE',
+        'fuente': 'TomaTicket',
+        'activo': 'TRUE',
+        'urlImagen': '',
+    }
+
+def preparar_hoja(filas, opciones, fraccion_pasados):
+    """Hoja con `filas` eventos (una fracción ya pasados, que se archivarán) y la cabecera"""
+    hoja = HojaFalsa(titulo=extractor.NOMBRE_HOJA, **opciones)
+    pasados = int(filas * fraccion_pasados)
+    eventos = [evento_sintetico(n, -30 - n % 60 if n < pasados else n % 365) for n in range(filas)]
+    eventos.sort(key=extractor.fecha_ordenable)
+    hoja.filas = [list(extractor.COLUMNAS)] + [extractor.evento_a_fila(e) for e in eventos]
+    return hoja
+
+def extraidos_sinteticos(filas, cantidad):
+    """
+    Lo que devolvería el scraper: la mitad ya existe (un tercio con el precio
+    cambiado) y la otra mitad es nueva, repartida por fechas entre las filas
+    """
+    eventos = [evento_sintetico(n, n % 365) for n in range(filas - cantidad // 2, filas + cantidad // 2)]
+    for evento in eventos[:cantidad // 2:3]:
+        evento['precio'] = "Desde 99 €"
+    return eventos
+
+# ======================================================================
+# PRUEBA
+# ======================================================================
+
+def guardar_huellas_previas(hoja):
+    """Estado estable: huellas de una ejecución anterior para todas las filas"""
+    indices = {campo: extractor.COLUMNAS.index(campo) for campo in extractor.CAMPOS_SCRAPER}
+    huellas = {
+        fila[0]: {campo: extractor.huella_valor(fila[i]) for campo, i in indices.items()}
+        for fila in hoja.filas[1:]
+    }
+    extractor.escribir_json_local(extractor.ARCHIVO_HUELLAS, huellas)
+
+def medir(filas, opciones, fraccion_pasados, cantidad):
+    hoja = preparar_hoja(filas, opciones, fraccion_pasados)
+    guardar_huellas_previas(hoja)
+    extraidos = extraidos_sinteticos(filas, cantidad)
+
+    inicio = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        existentes = extractor.obtener_eventos_existentes(hoja)
+        extractor.escribir_eventos(hoja, extraidos, existentes)
+    segundos = time.perf_counter() - inicio
+
+    # Suma las hojas de archivo creadas durante el ciclo
+    hojas = list(hoja.spreadsheet.hojas.values())
+    llamadas = {}
+    for h in hojas:
+        for metodo, n in h.llamadas.items():
+            llamadas[metodo] = llamadas.get(metodo, 0) + n
+    return {
+        'filas': filas,
+        'llamadas': sum(llamadas.values()),
+        'porMetodo': llamadas,
+        'erroresCuota': sum(h.errores_cuota for h in hojas),
+        'bytesLeidos': sum(h.bytes_leidos for h in hojas),
+        'bytesEscritos': sum(h.bytes_escritos for h in hojas),
+        'segundos': segundos,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del escritor de Sheets (hoja falsa)")
+    parser.add_argument('--filas', type=int, nargs='+', default=[100, 10_000, 50_000])
+    parser.add_argument('--latencia', type=float, default=0.0, help="segundos por llamada a la API")
+    parser.add_argument('--cuota', type=int, default=None, help="llamadas por minuto antes de 429")
+    parser.add_argument('--prob-error', type=float, default=0.0, help="probabilidad de 429 por llamada")
+    parser.add_argument('--pasados', type=float, default=0.05,
+                        help="fracción de filas ya pasadas (0 = sin archivado, solo cambios por celda)")
+    parser.add_argument('--extraidos', type=int, default=40,
+                        help="eventos que devuelve el scraper por ejecución (la mitad nuevos)")
+    args = parser.parse_args()
+
+    # Solo se mide el Sheet: fuera imágenes, índice y calendarios
+    extractor.PROCESAR_IMAGENES = False
+    extractor.PUBLICAR_INDICE_BUSQUEDA = False
+    extractor.EXPORTAR_CALENDARIOS = False
+    extractor.ARCHIVO_HUELLAS = os.path.join(tempfile.mkdtemp(), 'huellas_campos.json')
+
+    opciones = {'latencia': args.latencia, 'cuota_por_minuto': args.cuota,
+                'prob_error_cuota': args.prob_error, 'semilla': 1}
+
+    print("=" * 78)
+    print("⏱️ PRUEBA DE CARGA - leer → combinar → escribir")
+    print("=" * 78)
+    print(f"{'filas':>8} {'llamadas':>9} {'429':>5} {'KB leídos':>11} {'KB escritos':>12} {'segundos':>9}  por método")
+    for filas in args.filas:
+        r = medir(filas, opciones, args.pasados, args.extraidos)
+        metodos = ', '.join(f"{m}={n}" for m, n in sorted(r['porMetodo'].items()))
+        print(f"{r['filas']:>8} {r['llamadas']:>9} {r['erroresCuota']:>5} "
+              f"{r['bytesLeidos'] / 1024:>11.1f} {r['bytesEscritos'] / 1024:>12.1f} "
+              f"{r['segundos']:>9.2f}  {metodos}")
+
+if __name__ == "__main__":
+    main()